@@ -0,0 +1,121 @@
+''' Render every cached query result in a directory without a display, and
+write an HTML index to browse them. Useful after a sweep leaves behind many
+counter-examples to review '''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import html
+import matplotlib
+import os
+import pickle as pkl
+import traceback
+from typing import List, Optional, Tuple
+
+# Must be picked before plot imports pyplot
+matplotlib.use("Agg")
+
+from plot import plot_model  # noqa: E402
+from pyz3_utils import QueryResult  # noqa: E402
+
+
+class Rendered:
+    def __init__(self, cache_fname: str, satisfiable: str,
+                 img_fname: Optional[str], txt_fname: Optional[str],
+                 desc: str):
+        self.cache_fname = cache_fname
+        # 'sat', 'unsat', 'unknown' or 'error'
+        self.satisfiable = satisfiable
+        # Paths relative to the output directory. None if nothing was plotted
+        self.img_fname = img_fname
+        # What plot_model printed (or the exception, on error)
+        self.txt_fname = txt_fname
+        # Short description of the config, for the index
+        self.desc = desc
+
+
+def render_one(cache_fname: str, out_dir: str, fmt: str) -> Rendered:
+    ''' Plot one cached QueryResult to `out_dir`. Runs inside the worker '''
+    base = os.path.splitext(os.path.basename(cache_fname))[0]
+    txt_fname = base + ".txt"
+    try:
+        with open(cache_fname, "rb") as f:
+            qres: QueryResult = pkl.load(f)
+        c = qres.cfg
+        desc = f"cca={c.cca} T={c.T} N={c.N} buf_min={c.buf_min}"
+        satisfiable = str(qres.satisfiable)
+        if satisfiable != "sat":
+            return Rendered(cache_fname, satisfiable, None, None, desc)
+
+        img_fname = f"{base}.{fmt}"
+        with open(os.path.join(out_dir, txt_fname), "w") as f:
+            with contextlib.redirect_stdout(f):
+                plot_model(qres.model, c, qres.v,
+                           out_fname=os.path.join(out_dir, img_fname),
+                           show=False)
+        return Rendered(cache_fname, satisfiable, img_fname, txt_fname, desc)
+    except Exception:
+        with open(os.path.join(out_dir, txt_fname), "w") as f:
+            f.write(traceback.format_exc())
+        return Rendered(cache_fname, "error", None, txt_fname, "")
+
+
+def write_index(rendered: List[Rendered], out_fname: str):
+    rows = []
+    for r in rendered:
+        if r.img_fname is None:
+            img = ""
+        else:
+            img = '<a href="{0}"><img src="{0}" width="480"></a>'.format(
+                html.escape(r.img_fname))
+        txt = "" if r.txt_fname is None else '<a href="{}">output</a>'.format(
+            html.escape(r.txt_fname))
+        rows.append("<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td>"
+                    "<td>{}</td></tr>".format(
+                        html.escape(os.path.basename(r.cache_fname)),
+                        html.escape(r.satisfiable), html.escape(r.desc),
+                        txt, img))
+    with open(out_fname, "w") as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset='utf-8'>"
+                "<title>CCAC results</title></head><body>\n"
+                "<table border='1'>\n<tr><th>file</th><th>result</th>"
+                "<th>config</th><th>text</th><th>plot</th></tr>\n")
+        f.write("\n".join(rows))
+        f.write("\n</table></body></html>\n")
+
+
+def render_dir(cache_dir: str, out_dir: str, fmt: str = "png",
+               processes: Optional[int] = None) -> List[Rendered]:
+    '''Render every `.cached` file in `cache_dir` to `out_dir` on a pool of
+    `processes` workers (default: one per core), and write
+    `out_dir`/index.html. Results that aren't 'sat' are listed but not
+    plotted
+
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    fnames = sorted([os.path.join(cache_dir, x) for x in os.listdir(cache_dir)
+                     if x.endswith(".cached")])
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        rendered = list(pool.map(render_one, fnames,
+                                 [out_dir] * len(fnames),
+                                 [fmt] * len(fnames)))
+    write_index(rendered, os.path.join(out_dir, "index.html"))
+
+    counts: List[Tuple[str, int]] = [
+        (x, len([r for r in rendered if r.satisfiable == x]))
+        for x in ["sat", "unsat", "unknown", "error"]]
+    print(f"Rendered {len(rendered)} results to {out_dir}: " + ", ".join(
+        [f"{n} {x}" for (x, n) in counts if n > 0]))
+    return rendered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Plot all cached query results in a directory")
+    parser.add_argument("cache_dir", type=str)
+    parser.add_argument("--out", type=str, default="plots")
+    parser.add_argument("--format", type=str, default="png",
+                        choices=["png", "svg", "pdf"])
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    render_dir(args.cache_dir, args.out, args.format, args.processes)
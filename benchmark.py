@@ -0,0 +1,214 @@
+''' A fixed suite of representative queries, for catching changes to the model
+that make them slower. Each query is run at several horizons and flow counts
+in a fresh process with a fixed random seed, and we record the time to encode
+it, the time to solve it, the process's peak RSS and the result. These are
+compared against a baseline saved by an earlier run '''
+
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+from typing import Any, Callable, Dict, List, Optional
+import z3
+
+from config import ModelConfig
+from model import make_solver
+from pyz3_utils import MySolver
+from utils import make_periodic
+from variables import Variables
+
+# Adds the query's constraints to a solver that already encodes the model
+QueryConstraints = Callable[[ModelConfig, MySolver, Variables], None]
+
+
+class Benchmark:
+    def __init__(self, name: str, c: ModelConfig, query: QueryConstraints):
+        # Unique name, also used as the key in the baseline
+        self.name = name
+        self.c = c
+        self.query = query
+
+
+def aimd_low_util(c: ModelConfig, s: MySolver, v: Variables):
+    s.add(v.L[0] == 0)
+    s.add(v.S[-1] - v.S[0] < 0.5 * c.C * (c.T - 1))
+
+
+def bbr_low_util(c: ModelConfig, s: MySolver, v: Variables):
+    s.add(v.L[0] == 0)
+    s.add(v.S[-1] - v.S[0] < 0.1 * c.C * c.T)
+    make_periodic(c, s, v, 2 * c.R)
+
+
+def copa_low_util(c: ModelConfig, s: MySolver, v: Variables):
+    s.add(v.L[0] == v.L[-1])
+    s.add(v.S[-1] - v.S[0] < 0.1 * c.C * c.T)
+    make_periodic(c, s, v, c.R + c.D)
+
+
+def unfair(c: ModelConfig, s: MySolver, v: Variables):
+    ''' Can one flow get more than twice the throughput of another? '''
+    s.add(v.L[0] == 0)
+    s.add(v.S_f[0][-1] - v.S_f[0][0] > 2 * (v.S_f[1][-1] - v.S_f[1][0]))
+
+
+def suite() -> List[Benchmark]:
+    ''' The queries we care about, modeled on example_queries.py '''
+    res = []
+    for T in [8, 10, 15, 20]:
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.buf_min = 1
+        c.buf_max = 1
+        c.T = T
+        res.append(Benchmark(f"aimd_low_util_T{T}", c, aimd_low_util))
+
+        c = ModelConfig.default()
+        c.cca = "bbr"
+        c.compose = True
+        c.T = T
+        res.append(Benchmark(f"bbr_low_util_T{T}", c, bbr_low_util))
+
+        c = ModelConfig.default()
+        c.cca = "copa"
+        c.compose = False
+        c.calculate_qdel = True
+        c.T = T
+        res.append(Benchmark(f"copa_low_util_T{T}", c, copa_low_util))
+
+    # Multiple flows are much more expensive, so only the smaller horizons
+    for N in [2, 3]:
+        for T in [8, 10]:
+            c = ModelConfig.default()
+            c.cca = "aimd"
+            c.N = N
+            c.calculate_qdel = True
+            c.buf_min = 1
+            c.buf_max = 1
+            c.T = T
+            res.append(Benchmark(f"aimd_unfair_N{N}_T{T}", c, unfair))
+    return res
+
+
+def run_benchmark(b: Benchmark, timeout: float, seed: int) -> Dict[str, Any]:
+    '''Runs inside a freshly spawned worker process, so peak RSS is this
+    query's plus the fixed cost of the interpreter and z3. A forked worker
+    would also count the parent's resident pages'''
+    z3.set_param("smt.random_seed", seed)
+    z3.set_param("sat.random_seed", seed)
+
+    start = time.time()
+    s, v, _ = make_solver(b.c)
+    b.query(b.c, s, v)
+    encode_time = time.time() - start
+
+    s.set(timeout=int(timeout * 1000))
+    start = time.time()
+    satisfiable = str(s.check())
+    solve_time = time.time() - start
+
+    return {
+        "encode_time": encode_time,
+        "solve_time": solve_time,
+        # In KiB on Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "satisfiable": satisfiable,
+    }
+
+
+def run_suite(benchmarks: List[Benchmark], timeout: float, seed: int = 0,
+              repeat: int = 1) -> Dict[str, Dict[str, Any]]:
+    '''Run each benchmark `repeat` times, one at a time so they don't compete
+    for cores, each in its own process. Reports the fastest of the runs'''
+    res: Dict[str, Dict[str, Any]] = {}
+    for b in benchmarks:
+        runs = []
+        for _ in range(repeat):
+            with multiprocessing.get_context("spawn").Pool(
+                    processes=1, maxtasksperchild=1) as pool:
+                runs.append(pool.apply(run_benchmark, (b, timeout, seed)))
+        r = min(runs, key=lambda x: x["encode_time"] + x["solve_time"])
+        if len(set([x["satisfiable"] for x in runs])) > 1:
+            r["satisfiable"] = "inconsistent"
+        res[b.name] = r
+        print("{:<22} {:<8} encode {:>7.2f}s solve {:>7.2f}s rss {:>7.1f}MiB"
+              .format(b.name, r["satisfiable"], r["encode_time"],
+                      r["solve_time"], r["peak_rss"] / 1024))
+    return res
+
+
+def compare(results: Dict[str, Dict[str, Any]],
+            baseline: Dict[str, Dict[str, Any]], threshold: float = 0.2,
+            min_diff: float = 0.5) -> List[str]:
+    '''Differences from the baseline that count as regressions: a changed
+    result, or encode or solve time that grew by more than a `threshold`
+    fraction and by more than `min_diff` seconds (so that small queries don't
+    trip on noise). Peak RSS is held to the same relative threshold. Returns
+    one description per regression
+
+    '''
+    regressions = []
+    for (name, r) in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        if r["satisfiable"] != old["satisfiable"]:
+            regressions.append(
+                f"{name}: result changed from {old['satisfiable']} to "
+                f"{r['satisfiable']}")
+        for k in ["encode_time", "solve_time"]:
+            if r[k] > old[k] * (1 + threshold) and r[k] - old[k] > min_diff:
+                regressions.append(
+                    f"{name}: {k} went from {old[k]:.2f}s to {r[k]:.2f}s")
+        if r["peak_rss"] > old["peak_rss"] * (1 + threshold):
+            regressions.append(
+                f"{name}: peak_rss went from {old['peak_rss'] / 1024:.1f}MiB "
+                f"to {r['peak_rss'] / 1024:.1f}MiB")
+    return regressions
+
+
+def load_baseline(fname: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    try:
+        with open(fname) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the benchmark suite and compare with the baseline")
+    parser.add_argument("--baseline", type=str,
+                        default="benchmark_baseline.json")
+    # Overwrite the baseline with this run's results instead of comparing
+    parser.add_argument("--save", action="store_true")
+    # Only run benchmarks whose name contains this
+    parser.add_argument("--filter", type=str, default="")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1)
+    # Fractional increase allowed before it counts as a regression
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    benchmarks = [b for b in suite() if args.filter in b.name]
+    results = run_suite(benchmarks, args.timeout, args.seed, args.repeat)
+
+    baseline = load_baseline(args.baseline)
+    if args.save:
+        # Keep the entries we didn't re-run
+        baseline = baseline or {}
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif baseline is None:
+        print(f"No baseline at {args.baseline}. Run with --save to create one")
+    else:
+        regressions = compare(results, baseline, args.threshold)
+        for x in regressions:
+            print("REGRESSION " + x)
+        if len(regressions) > 0:
+            exit(1)
+        print("No regressions")
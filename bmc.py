@@ -0,0 +1,75 @@
+''' Bounded model checking with incremental horizon extension. Instead of
+fixing c.T up front, we check the query at increasing horizons, reusing one
+solver and adding only the constraints for the new timesteps each time. Most
+counter-examples show up at small horizons, so this avoids paying for the
+largest one up front '''
+
+from copy import copy
+import time
+from typing import Callable, List, Optional, Tuple
+
+from config import ModelConfig
+from model import horizon_dependent, make_solver
+from pyz3_utils import MySolver, QueryResult, run_query
+from variables import Variables
+
+# Adds the query's own constraints (e.g. s.add(v.S[-1] - v.S[0] < ...)).
+# Called afresh for every horizon, so it may refer to the last timestep
+Query = Callable[[ModelConfig, MySolver, Variables], None]
+
+
+def run_bmc(c: ModelConfig, horizons: List[int], query: Query,
+            timeout: float = 10) -> Tuple[int, Optional[QueryResult]]:
+    '''Check `query` at each horizon in `horizons` (in increasing order) and
+    stop at the first one where it is satisfiable. Returns that horizon and
+    the result, or the last horizon and its result if none was 'sat'. The
+    config's own c.T is ignored.
+
+    The model is extended in place: constraints that depend on the horizon
+    and the query itself are added inside a push/pop scope. If
+    c.calculate_qdel, the "index" qdel encoding is required
+
+    '''
+    assert len(horizons) > 0
+    assert horizons == sorted(horizons), "Horizons must be increasing"
+
+    s: Optional[MySolver] = None
+    v: Optional[Variables] = None
+    qres: Optional[QueryResult] = None
+    prev = 0
+    for T in horizons:
+        cT = copy(c)
+        cT.T = T
+        start = time.time()
+        s, v, _ = make_solver(cT, s, v, t0=prev)
+        prev = T
+
+        # MySolver doesn't wrap push/pop, so scope the wrapped z3 solver
+        s.s.push()
+        horizon_dependent(cT, s, v)
+        query(cT, s, v)
+        qres = run_query(cT, s, v, timeout)
+        s.s.pop()
+        print(f"T = {T}: {qres.satisfiable} in {time.time() - start:.1f}s")
+        if str(qres.satisfiable) == "sat":
+            return (T, qres)
+    return (horizons[-1], qres)
+
+
+if __name__ == "__main__":
+    # Example: find the smallest horizon at which AIMD can get < 50%
+    # utilization
+    c = ModelConfig.default()
+    c.cca = "aimd"
+    c.buf_min = 1
+    c.buf_max = 1
+
+    def low_util(c: ModelConfig, s: MySolver, v: Variables):
+        s.add(v.S[-1] - v.S[0] < 0.5 * c.C * (c.T - 1))
+
+    T, qres = run_bmc(c, list(range(5, 21, 5)), low_util)
+    if qres is not None and str(qres.satisfiable) == "sat":
+        from plot import plot_model
+        cT = copy(c)
+        cT.T = T
+        plot_model(qres.model, cT, qres.v)
@@ -1,4 +1,5 @@
-from z3 import And, Implies, Not, Or
+from typing import Optional
+from z3 import And, If, Implies, Not, Or
 
 from config import ModelConfig
 from pyz3_utils import MySolver
@@ -6,26 +7,40 @@ from variables import Variables
 
 
 class AIMDVariables:
-    def __init__(self, c: ModelConfig, s: MySolver):
+    def __init__(self, c: ModelConfig, s: MySolver,
+                 name: Optional[str] = None):
+        # Prefix for the names, as in `Variables`
+        pre = "" if name is None else name + "__"
         # Whether or not cwnd can increase at this point
-        self.incr_f = [[s.Bool(f"aimd_incr_{n},{t}") for t in range(c.T)]
+        self.incr_f = [[s.Bool(f"{pre}aimd_incr_{n},{t}") for t in range(c.T)]
                        for n in range(c.N)]
+        if c.aimd_incr_encoding == "linear":
+            # S_f at the start of the current run of equal cwnds, i.e. at the
+            # last time cwnd changed
+            self.since_f = [[s.Real(f"{pre}aimd_since_{n},{t}")
+                             for t in range(c.T)]
+                            for n in range(c.N)]
 
 
 def can_incr(
         c: ModelConfig,
         s: MySolver,
         v: Variables,
-        cv: AIMDVariables):
+        cv: AIMDVariables,
+        t0: int = 0):
     # Always increase
     if c.aimd_incr_irrespective:
         for n in range(c.N):
-            for t in range(c.T):
+            for t in range(t0, c.T):
                 s.add(cv.incr_f[n][t])
         return
 
+    if c.aimd_incr_encoding == "linear":
+        can_incr_linear(c, s, v, cv, t0)
+        return
+
     for n in range(c.N):
-        for t in range(1, c.T):
+        for t in range(max(1, t0), c.T):
             # Increase cwnd only if we have got enough acks
             incr = []
             for dt in range(1, t):
@@ -49,18 +64,45 @@ def can_incr(
             s.add(cv.incr_f[n][t] == Or(*incr))
 
 
-def cca_aimd(c: ModelConfig, s: MySolver, v: Variables) -> AIMDVariables:
+def can_incr_linear(
+        c: ModelConfig,
+        s: MySolver,
+        v: Variables,
+        cv: AIMDVariables,
+        t0: int = 0):
+    '''Equivalent to the disjunction in `can_incr`, but with constant-size
+    constraints per timestep instead of O(T^2). If cwnd has been the same
+    since time t-dt, the disjunct for dt is the only one that can hold, and it
+    compares S_f[t] to S_f[t-dt], which we track in `cv.since_f`'''
+    for n in range(c.N):
+        if t0 == 0:
+            s.add(cv.since_f[n][0] == v.S_f[n][0])
+        for t in range(max(1, t0), c.T):
+            same = v.c_f[n][t-1] == v.c_f[n][t]
+            s.add(cv.since_f[n][t] == If(same, cv.since_f[n][t-1],
+                                         v.S_f[n][t]))
+            s.add(cv.incr_f[n][t] == Or(
+                And(same, v.S_f[n][t] - cv.since_f[n][t-1] >= v.c_f[n][t]),
+                v.S_f[n][t] - v.S_f[n][t-1] >= v.c_f[n][t]))
+
+
+def cca_aimd(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0)\
+        -> AIMDVariables:
+    ''' If t0 > 0, only add constraints for timesteps t0 onward (see
+    `make_solver`) '''
     cv = AIMDVariables(c, s)
-    can_incr(c, s, v, cv)
+    can_incr(c, s, v, cv, t0)
 
     # The last send sequence number at which loss was detected
     ll = [[s.Real(f"last_loss_{n},{t}") for t in range(c.T)]
           for n in range(c.N)]
-    s.add(v.dupacks == 3 * v.alpha)
+    if t0 == 0:
+        s.add(v.dupacks == 3 * v.alpha)
     for n in range(c.N):
         # TODO: make this non-deterministic?
-        s.add(ll[n][0] == v.S_f[n][0])
-        for t in range(c.T):
+        if t0 == 0:
+            s.add(ll[n][0] == v.S_f[n][0])
+        for t in range(t0, c.T):
             if c.pacing:
                 s.add(v.r_f[n][t] == v.c_f[n][t] / c.R)
             else:
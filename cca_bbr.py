@@ -14,38 +14,64 @@ class BBRSimpleVariables:
             [s.Int(f"bbr_start_state_{n}") for n in range(c.N)]
 
 
-def cca_bbr(c: ModelConfig, s: MySolver, v: Variables):
+def cca_bbr(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
+    ''' If t0 > 0, only add constraints for timesteps t0 onward (see
+    `make_solver`) '''
     # The period over which we compute rates
     P = c.R
-    # Number of RTTs over which we compute the max_cwnd (=10 in the spec)
-    max_R = 4
-    # The number of RTTs in the BBR cycle (=8 in the spec)
-    cycle = 4
+    # Number of RTTs over which we compute the max_cwnd
+    max_R = c.bbr_max_R
+    # The number of RTTs in the BBR cycle
+    cycle = c.bbr_cycle
     # The state the flow starts in at t=0
     start_state_f = [s.Int(f"bbr_start_state_{n}") for n in range(c.N)]
+    # The first timestep at which we can compute a rate
+    first = c.R + P
 
     for n in range(c.N):
-        s.add(start_state_f[n] >= 0)
-        s.add(start_state_f[n] < cycle)
-        for t in range(c.R + P, c.T):
-            # Compute the max RTT over the last max_R RTTs
-            max_rate = [s.Real(f"max_rate_{n},{t},{dt}")
-                        for dt in range(min(t-c.R-P+1, max_R))]
-            s.add(max_rate[0] == (v.S_f[n][t-c.R] - v.S_f[n][t-c.R-P]) / P)
-            for dt in range(1, len(max_rate)):
-                rate = (v.S_f[n][t-dt-c.R] - v.S_f[n][t-dt-c.R-P]) / P
-                s.add(max_rate[dt] == If(rate > max_rate[dt-1],
-                                         rate, max_rate[dt-1]))
-
-            # Convenience variable for plotting
-            s.add(s.Real(f"max_rate_{n},{t}") == max_rate[-1])
-
-            s.add(v.c_f[n][t] == 2 * max_rate[-1] * P)
+        if t0 == 0:
+            s.add(start_state_f[n] >= 0)
+            s.add(start_state_f[n] < cycle)
+
+        # The rate measured at t. Shared by the max_R windows that contain t
+        rate = [s.Real(f"bbr_rate_{n},{t}") for t in range(c.T)]
+        # To get the max over the window ending at each t without
+        # recomputing it, split time into blocks of max_R timesteps. Every
+        # window is the end of one block followed by the start of the next,
+        # so its max is the max of a suffix max and a prefix max
+        prefix = [s.Real(f"bbr_max_prefix_{n},{t}") for t in range(c.T)]
+        suffix = [s.Real(f"bbr_max_suffix_{n},{t}") for t in range(c.T)]
+
+        for t in range(max(first, t0), c.T):
+            s.add(rate[t] == (v.S_f[n][t-c.R] - v.S_f[n][t-c.R-P]) / P)
+            if (t - first) % max_R == 0:
+                s.add(prefix[t] == rate[t])
+            else:
+                s.add(prefix[t] == If(rate[t] > prefix[t-1],
+                                      rate[t], prefix[t-1]))
+            if (t - first) % max_R == max_R - 1:
+                # The block is complete, so we can compute its suffix maxes
+                s.add(suffix[t] == rate[t])
+                for u in range(t - 1, t - max_R, -1):
+                    s.add(suffix[u] == If(rate[u] > suffix[u+1],
+                                          rate[u], suffix[u+1]))
+
+            # Compute the max rate over the last max_R timesteps
+            max_rate = s.Real(f"max_rate_{n},{t}")
+            start = t - max_R + 1
+            if start <= first or (t - first) % max_R == max_R - 1:
+                # The window is within one block
+                s.add(max_rate == prefix[t])
+            else:
+                s.add(max_rate == If(suffix[start] > prefix[t],
+                                     suffix[start], prefix[t]))
+
+            s.add(v.c_f[n][t] == 2 * max_rate * P)
             s_0 = (start_state_f[n] == (0 - t / c.R) % cycle)
             s_1 = (start_state_f[n] == (1 - t / c.R) % cycle)
             s.add(Implies(s_0,
-                          v.r_f[n][t] == 1.25 * max_rate[-1]))
+                          v.r_f[n][t] == 1.25 * max_rate))
             s.add(Implies(s_1,
-                          v.r_f[n][t] == 0.8 * max_rate[-1]))
+                          v.r_f[n][t] == 0.8 * max_rate))
             s.add(Implies(And(Not(s_0), Not(s_1)),
-                          v.r_f[n][t] == 1 * max_rate[-1]))
+                          v.r_f[n][t] == 1 * max_rate))
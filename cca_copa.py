@@ -1,13 +1,93 @@
-from z3 import And, If, Implies, Not, Or
+from typing import Tuple
+from z3 import And, BoolRef, If, Implies, Not, Or
 
 from config import ModelConfig
 from pyz3_utils import MySolver
 from variables import Variables
 
 
-def cca_copa(c: ModelConfig, s: MySolver, v: Variables):
+def allowed_disjunction(c: ModelConfig, s: MySolver, v: Variables, n: int,
+                        t: int) -> Tuple[BoolRef, BoolRef]:
+    ''' Whether flow n may increase/decrease cwnd at t, with a boolean for
+    every possible queueing delay. Only supports D = 1; use `allowed_linear`
+    (copa_encoding="linear") for D > 1 '''
+    incr_alloweds, decr_alloweds = [], []
+    for dt in range(t+1):
+        # Whether we are allowd to increase/decrease
+        incr_allowed = s.Bool("incr_allowed_%d,%d,%d" % (n, t, dt))
+        decr_allowed = s.Bool("decr_allowed_%d,%d,%d" % (n, t, dt))
+        # Warning: Adversary here is too powerful if D > 1. Add
+        # a constraint for every point between t-1 and t-1-D
+        assert(c.D == 1)
+        s.add(incr_allowed
+              == And(
+                  v.qdel_is(t-c.R, dt),
+                  v.S[t-c.R] > v.S[t-c.R-1],
+                  v.c_f[n][t-1] * max(0, dt-1)
+                  <= v.alpha*(c.R+max(0, dt-1))))
+        s.add(decr_allowed
+              == And(
+                  v.qdel_is(t-c.R-c.D, dt),
+                  v.S[t-c.R] > v.S[t-c.R-1],
+                  v.c_f[n][t-1] * dt >= v.alpha * (c.R + dt)))
+        incr_alloweds.append(incr_allowed)
+        decr_alloweds.append(decr_allowed)
+    # If inp is high at the beginning, qdel can be arbitrarily
+    # large
+    decr_alloweds.append(v.S[t-c.R] < v.A[0] - v.L[0])
+
+    return (Or(*incr_alloweds), Or(*decr_alloweds))
+
+
+def allowed_linear(c: ModelConfig, v: Variables, n: int, t: int)\
+        -> Tuple[BoolRef, BoolRef]:
+    '''Like `allowed_disjunction`, but in terms of the queueing delay at each
+    timestep, t - qdel_index[t], so no per-delay booleans are needed.
+
+    Multiplying cwnd by the delay isn't linear, so we still compare cwnd to
+    the threshold for each delay k. But since alpha > 0, "cwnd * k <= alpha *
+    (R + k)" only gets harder as k grows, so increasing is allowed iff it
+    holds for every k up to the delay. Similarly decreasing is allowed iff
+    "cwnd * k >= alpha * (R + k)" holds for every k from the delay up.
+
+    With D > 1, the last ack may have been delayed by anything up to D, so
+    any of the D most recent delay samples may be the one Copa reacts to. A
+    sample with qdel_index 0 has no known delay, so it allows neither
+
+    '''
+    def delay(t: int):
+        return t - v.qdel_index[t]
+
+    cwnd = v.c_f[n][t-1]
+    incr_alloweds, decr_alloweds = [], []
+    for d in range(c.D):
+        t_incr = t - c.R - d
+        # k = 0 (delays of 0 and 1) always holds
+        incr_alloweds.append(And(
+            [v.qdel_index[t_incr] >= 1]
+            + [Implies(delay(t_incr) - 1 >= k,
+                       cwnd * k <= v.alpha * (c.R + k))
+               for k in range(1, t_incr)]))
+        t_decr = t - c.R - d - 1
+        decr_alloweds.append(And(
+            [v.qdel_index[t_decr] >= 1]
+            + [Implies(delay(t_decr) <= k, cwnd * k >= v.alpha * (c.R + k))
+               for k in range(t_decr + 1)]))
+    moved = v.S[t-c.R] > v.S[t-c.R-1]
+    # If inp is high at the beginning, qdel can be arbitrarily large
+    return (And(moved, Or(*incr_alloweds)),
+            Or(And(moved, Or(*decr_alloweds)),
+               v.S[t-c.R] < v.A[0] - v.L[0]))
+
+
+def cca_copa(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
+    ''' If t0 > 0, only add constraints for timesteps t0 onward (see
+    `make_solver`) '''
+    if c.copa_encoding == "linear":
+        assert c.qdel_encoding == "index", \
+            "The linear Copa encoding needs the 'index' qdel encoding"
     for n in range(c.N):
-        for t in range(c.T):
+        for t in range(t0, c.T):
             # Basic constraints
             s.add(v.c_f[n][t] > 0)
             s.add(v.r_f[n][t] == v.c_f[n][t] / c.R)
@@ -15,33 +95,11 @@ def cca_copa(c: ModelConfig, s: MySolver, v: Variables):
             if t - c.R - c.D < 0:
                 continue
 
-            incr_alloweds, decr_alloweds = [], []
-            for dt in range(t+1):
-                # Whether we are allowd to increase/decrease
-                incr_allowed = s.Bool("incr_allowed_%d,%d,%d" % (n, t, dt))
-                decr_allowed = s.Bool("decr_allowed_%d,%d,%d" % (n, t, dt))
-                # Warning: Adversary here is too powerful if D > 1. Add
-                # a constraint for every point between t-1 and t-1-D
-                assert(c.D == 1)
-                s.add(incr_allowed
-                      == And(
-                          v.qdel[t-c.R][dt],
-                          v.S[t-c.R] > v.S[t-c.R-1],
-                          v.c_f[n][t-1] * max(0, dt-1)
-                          <= v.alpha*(c.R+max(0, dt-1))))
-                s.add(decr_allowed
-                      == And(
-                          v.qdel[t-c.R-c.D][dt],
-                          v.S[t-c.R] > v.S[t-c.R-1],
-                          v.c_f[n][t-1] * dt >= v.alpha * (c.R + dt)))
-                incr_alloweds.append(incr_allowed)
-                decr_alloweds.append(decr_allowed)
-            # If inp is high at the beginning, qdel can be arbitrarily
-            # large
-            decr_alloweds.append(v.S[t-c.R] < v.A[0] - v.L[0])
-
-            incr_allowed = Or(*incr_alloweds)
-            decr_allowed = Or(*decr_alloweds)
+            if c.copa_encoding == "linear":
+                incr_allowed, decr_allowed = allowed_linear(c, v, n, t)
+            else:
+                incr_allowed, decr_allowed = allowed_disjunction(
+                    c, s, v, n, t)
 
             # Either increase or decrease cwnd
             incr = s.Bool("incr_%d,%d" % (n, t))
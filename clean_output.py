@@ -2,27 +2,62 @@
 behind only the essential details for why the counter-example works '''
 
 from config import ModelConfig
-from copy import copy, deepcopy
+from copy import copy
 from fractions import Fraction
 from functools import reduce
 from pyz3_utils import ModelDict, extract_vars
 import numpy as np
 import operator
-from scipy.optimize import LinearConstraint, minimize
-from typing import Any, Dict, List, Set, Tuple, Union
+from scipy.optimize import LinearConstraint, linprog, minimize
+from scipy.sparse import csr_matrix, hstack, identity, vstack
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from utils import model_to_dict
 from z3 import And, ArithRef, AstVector, BoolRef, IntNumRef, Not,\
-    RatNumRef, substitute
+    RatNumRef, Solver, sat
 
 
 Expr = Union[BoolRef, ArithRef]
 
 
-def eval_smt(m: ModelDict, a: Expr) -> Union[Fraction, bool]:
+# Values of subterms already evaluated under a model, keyed by Z3 AST id. We
+# keep a reference to the term so its id can't be reused while cached
+EvalCache = Dict[int, Tuple[Expr, Union[Fraction, bool]]]
+
+
+def eval_smt(m: ModelDict, a: Expr, cache: Optional[EvalCache] = None)\
+        -> Union[Fraction, bool]:
+    '''Evaluate `a` under `m`. Walks the term DAG iteratively, evaluating
+    each distinct subterm once. Pass the same `cache` to repeated calls with
+    the same model to share work between them
+
+    '''
     if type(a) is AstVector:
         a = And(a)
-
+    if cache is None:
+        cache = {}
+
+    # Post-order traversal. The flag says whether the children have already
+    # been pushed
+    stack: List[Tuple[Expr, bool]] = [(a, False)]
+    while len(stack) > 0:
+        cur, expanded = stack.pop()
+        if cur.get_id() in cache:
+            continue
+        children = cur.children()
+        if not expanded and len(children) > 0:
+            stack.append((cur, True))
+            stack.extend([(x, False) for x in children
+                          if x.get_id() not in cache])
+            continue
+        val = eval_node(m, cur, [cache[x.get_id()][1] for x in children])
+        cache[cur.get_id()] = (cur, val)
+    return cache[a.get_id()][1]
+
+
+def eval_node(m: ModelDict, a: Expr, children: List[Union[Fraction, bool]])\
+        -> Union[Fraction, bool]:
+    ''' Evaluate `a` given the values of its children '''
     decl = str(a.decl())
-    children = [eval_smt(m, x) for x in a.children()]
 
     if len(children) == 0:
         if type(a) is ArithRef:
@@ -39,20 +74,20 @@ def eval_smt(m: ModelDict, a: Expr) -> Union[Fraction, bool]:
             return m[str(a)]
 
     if decl == "Not":
-        assert(len(a.children()) == 1)
+        assert(len(children) == 1)
         return not children[0]
     if decl == "And":
         return all(children)
     if decl == "Or":
         return any(children)
     if decl == "Implies":
-        assert(len(a.children()) == 2)
+        assert(len(children) == 2)
         if children[0] is True and children[1] is False:
             return False
         else:
             return True
     if decl == "If":
-        assert(len(a.children()) == 3)
+        assert(len(children) == 3)
         if children[0] is True:
             return children[1]
         else:
@@ -60,9 +95,9 @@ def eval_smt(m: ModelDict, a: Expr) -> Union[Fraction, bool]:
     if decl == "+":
         return sum(children, start=Fraction(0))
     if decl == "-":
-        if len(a.children()) == 2:
+        if len(children) == 2:
             return children[0] - children[1]
-        elif len(a.children()) == 1:
+        elif len(children) == 1:
             return -children[0]
         else:
             assert(False)
@@ -72,22 +107,22 @@ def eval_smt(m: ModelDict, a: Expr) -> Union[Fraction, bool]:
         assert(len(children) == 2)
         return children[0] / children[1]
     if decl == "<":
-        assert(len(a.children()) == 2)
+        assert(len(children) == 2)
         return children[0] < children[1]
     if decl == "<=":
-        assert(len(a.children()) == 2)
+        assert(len(children) == 2)
         return children[0] <= children[1]
     if decl == ">":
-        assert(len(a.children()) == 2)
+        assert(len(children) == 2)
         return children[0] > children[1]
     if decl == ">=":
-        assert(len(a.children()) == 2)
+        assert(len(children) == 2)
         return children[0] >= children[1]
     if decl == "==":
-        assert(len(a.children()) == 2)
+        assert(len(children) == 2)
         return children[0] == children[1]
     if decl == "Distinct":
-        assert(len(a.children()) == 2)
+        assert(len(children) == 2)
         return children[0] != children[1]
     print(f"Unrecognized decl {decl} in {a}")
     exit(1)
@@ -98,51 +133,75 @@ def substitute_if(
         a: BoolRef) -> Tuple[BoolRef, List[BoolRef]]:
     ''' Substitute any 'If(c, t, f)' expressions with 't' if 'c' is true under
     'm' and with 'f' otherwise. Also returns a list of 'c's from all the 'If's,
-    since they need to be asserted true as well '''
+    since they need to be asserted true as well. Done in one top-down pass
+    that rewrites each distinct subterm once and skips the branches that
+    weren't taken '''
 
     # The set of 'c's for 'If's
-    conds = []
-    res = deepcopy(a)
-    # BFS queue
-    if type(res) == AstVector:
-        res = And(res)
-    queue = [res]
-    while len(queue) > 0:
-        cur = queue[0]
-        queue = queue[1:]
-        if str(cur.decl()) == "If":
-            assert(len(cur.children()) == 3)
-            c, t, f = cur.children()
-            if eval_smt(m, c):
-                res = substitute(res, (cur, t))
-                queue.append(t)
-                c, new_conds = substitute_if(m, c)
-                conds.append(c)
-                conds.extend(new_conds)
+    conds: List[BoolRef] = []
+    if type(a) == AstVector:
+        a = And(a)
+    cache: EvalCache = {}
+    # Rewritten version of every subterm seen so far, keyed by AST id. We
+    # keep a reference to the original so its id can't be reused
+    rewritten: Dict[int, Tuple[Expr, Expr]] = {}
+
+    def needed(e: Expr) -> List[Expr]:
+        ''' The children whose rewritten versions `e` needs '''
+        if str(e.decl()) == "If":
+            c, t, f = e.children()
+            return [c, t if eval_smt(m, c, cache) else f]
+        return e.children()
+
+    def rewrite(root: Expr) -> Expr:
+        # Post-order traversal with an explicit stack, as in eval_smt, since
+        # deep If chains would overflow Python's recursion limit. The flag
+        # says whether the children have already been pushed
+        stack: List[Tuple[Expr, bool]] = [(root, False)]
+        while len(stack) > 0:
+            e, expanded = stack.pop()
+            if e.get_id() in rewritten:
+                continue
+            children = needed(e)
+            if not expanded and len(children) > 0:
+                stack.append((e, True))
+                stack.extend([(x, False) for x in children
+                              if x.get_id() not in rewritten])
+                continue
+            new_children = [rewritten[x.get_id()][1] for x in children]
+            if str(e.decl()) == "If":
+                c, branch = new_children
+                conds.append(c if eval_smt(m, e.arg(0), cache) else Not(c))
+                res = branch
+            elif all([x.eq(y) for (x, y) in zip(children, new_children)]):
+                res = e
             else:
-                res = substitute(res, (cur, f))
-                queue.append(f)
-                c, new_conds = substitute_if(m, Not(c))
-                conds.append(c)
-                conds.extend(new_conds)
-        else:
-            queue.extend(cur.children())
+                res = e.decl()(*new_children)
+            rewritten[e.get_id()] = (e, res)
+        return rewritten[root.get_id()][1]
+
+    res = rewrite(a)
     return (res, conds)
 
 
-def anded_constraints(m: ModelDict, a: Expr, truth=True, top_level=True)\
-        -> List[Expr]:
+def anded_constraints(m: ModelDict, a: Expr, truth=True, top_level=True,
+                      cache: Optional[EvalCache] = None) -> List[Expr]:
     ''' We'll find a subset of linear inequalities that are satisfied in the
     solution. To simplify computation, we'll only search for "nice" solutions
     within this set. 'a' is an assertion. 'top_level' and 'truth' are internal
     variables and indicate what we expect the truth value of the sub-expression
-    to be and whether we are in the top level of recursion respectively '''
+    to be and whether we are in the top level of recursion respectively.
+    'cache' is shared with eval_smt across the recursion, so each subterm is
+    evaluated only once '''
+
+    if cache is None:
+        cache = {}
 
     # No point searching for solutions if we are not given a satisfying
     # assignment to begin with
-    if eval_smt(m, a) != truth:
+    if eval_smt(m, a, cache) != truth:
         print(a, truth)
-    assert(eval_smt(m, a) == truth)
+    assert(eval_smt(m, a, cache) == truth)
 
     if type(a) is AstVector:
         a = And(a)
@@ -166,12 +225,14 @@ def anded_constraints(m: ModelDict, a: Expr, truth=True, top_level=True)\
                 assert(type(x) is BoolRef and type(y) is BoolRef)
                 # It should evaluate to what it evaluated in the original
                 # assignment
-                return (anded_constraints(m, x, eval_smt(m, x), False)
-                        + anded_constraints(m, y, eval_smt(m, y), False))
+                return (anded_constraints(m, x, eval_smt(m, x, cache), False,
+                                          cache)
+                        + anded_constraints(m, y, eval_smt(m, y, cache), False,
+                                            cache))
 
         if decl == "Distinct":
             # Convert != to either < or >
-            if eval_smt(m, x) < eval_smt(m, y):
+            if eval_smt(m, x, cache) < eval_smt(m, y, cache):
                 return [x < y]
             else:
                 return [y < x]
@@ -185,6 +246,8 @@ def anded_constraints(m: ModelDict, a: Expr, truth=True, top_level=True)\
                 return [x > y]
             if decl == ">=":
                 return [x >= y]
+            if decl == "==":
+                return [x == y]
         return [a]
     # if decl == "If":
     #     assert(len(a.children()) == 3)
@@ -196,41 +259,45 @@ def anded_constraints(m: ModelDict, a: Expr, truth=True, top_level=True)\
 
     if decl == "Not":
         assert(len(a.children()) == 1)
-        return anded_constraints(m, a.children()[0], (not truth), False)
+        return anded_constraints(m, a.children()[0], (not truth), False,
+                                 cache)
     if decl == "And":
         if truth:
-            return sum([anded_constraints(m, x, True, False)
+            return sum([anded_constraints(m, x, True, False, cache)
                         for x in a.children()],
                        start=[])
         else:
             for x in a.children():
-                if not eval_smt(m, x):
+                if not eval_smt(m, x, cache):
                     # Return just the first one (arbitrary choice). Returning
                     # more causes us to be unnecessarily restrictive
-                    return anded_constraints(m, x, False, False)
+                    return anded_constraints(m, x, False, False, cache)
     if decl == "Or":
         if truth:
             for x in a.children():
-                if eval_smt(m, x):
+                if eval_smt(m, x, cache):
                     # Return just the first one (arbitrary choice). Returning
                     # more causes us to be unnecessarily restrictive
-                    return anded_constraints(m, x, True, False)
+                    return anded_constraints(m, x, True, False, cache)
         else:
-            return sum([anded_constraints(m, x, False, False)
+            return sum([anded_constraints(m, x, False, False, cache)
                         for x in a.children()],
                        start=[])
 
     if decl == "Implies":
         assert(len(a.children()) == 2)
-        assert(type(eval_smt(m, a.children()[0])) is bool)
+        assert(type(eval_smt(m, a.children()[0], cache)) is bool)
         if truth:
-            if eval_smt(m, a.children()[0]):
-                return anded_constraints(m, a.children()[1], True, False)
+            if eval_smt(m, a.children()[0], cache):
+                return anded_constraints(m, a.children()[1], True, False,
+                                         cache)
             else:
-                return anded_constraints(m, a.children()[0], False, False)
+                return anded_constraints(m, a.children()[0], False, False,
+                                         cache)
         else:
-            return (anded_constraints(m, a.children()[0], True, False)
-                    + anded_constraints(m, a.children()[1], False, False))
+            return (anded_constraints(m, a.children()[0], True, False, cache)
+                    + anded_constraints(m, a.children()[1], False, False,
+                                        cache))
     if type(a) is BoolRef:
         # Must be a boolean variable. We needn't do anything here
         return []
@@ -313,7 +380,9 @@ def solver_constraints(constraints: List[Any])\
         -> Tuple[List[LinearConstraint], Dict[str, int]]:
     ''' Given a list of SMT constraints (e.g. those output by
     `anded_constraints`), return the corresponding LinearConstraint object and
-    the names of the variables in the order used in LinearConstraint '''
+    the names of the variables in the order used in LinearConstraint. The
+    constraint matrices are sparse, since each constraint only involves a
+    handful of variables '''
 
     tol = 1e-9
 
@@ -326,11 +395,12 @@ def solver_constraints(constraints: List[Any])\
     n_eq = sum([int(str(cons.decl()) == "==") for cons in constraints])
     n_ineq = len(constraints) - n_eq
 
-    A_eq = np.zeros((n_eq, len(vars)))
+    # Coordinate-format (row, col, value) entries of the matrices
+    A_eq: Tuple[List[int], List[int], List[float]] = ([], [], [])
     lb_eq = np.zeros(n_eq)
     ub_eq = np.zeros(n_eq)
 
-    A_ineq = np.zeros((n_ineq, len(vars)))
+    A_ineq: Tuple[List[int], List[int], List[float]] = ([], [], [])
     lb_ineq = np.zeros(n_ineq)
     ub_ineq = np.zeros(n_ineq)
 
@@ -353,12 +423,14 @@ def solver_constraints(constraints: List[Any])\
             lin.constant += 1e-6
 
         # Put it into the matrix
+        if str(cons.decl()) == "==":
+            row, entries = i_eq, A_eq
+        else:
+            row, entries = i_ineq, A_ineq
         for k in lin.vars:
-            j = vars[k]
-            if str(cons.decl()) == "==":
-                A_eq[i_eq, j] = lin.vars[k]
-            else:
-                A_ineq[i_ineq, j] = lin.vars[k]
+            entries[0].append(row)
+            entries[1].append(vars[k])
+            entries[2].append(lin.vars[k])
 
         # Make the bounds
         if str(cons.decl()) == "==":
@@ -372,67 +444,115 @@ def solver_constraints(constraints: List[Any])\
     assert(i_eq == n_eq)
     assert(i_ineq == n_ineq)
 
-    return ([LinearConstraint(A_eq, lb_eq, ub_eq, keep_feasible=False),
-             LinearConstraint(A_ineq, lb_ineq, ub_ineq, keep_feasible=False)],
+    def to_sparse(entries, n_rows: int) -> csr_matrix:
+        rows, cols, vals = entries
+        return csr_matrix((vals, (rows, cols)), shape=(n_rows, len(vars)))
+
+    return ([LinearConstraint(to_sparse(A_eq, n_eq), lb_eq, ub_eq,
+                              keep_feasible=False),
+             LinearConstraint(to_sparse(A_ineq, n_ineq), lb_ineq, ub_ineq,
+                              keep_feasible=False)],
             vars)
 
 
+def smoothness_operator(c: ModelConfig, vars: Dict[str, int], p: int = 2)\
+        -> csr_matrix:
+    '''A sparse matrix D such that |D x|_p^p is the smoothness score of the
+    solution x: the (weighted) sum of (p-th powers of) differences between
+    consecutive timesteps of total arrival, total service, wastage and the
+    cwnds. Series that don't appear in `vars` are skipped
+
+    '''
+    series: List[Tuple[str, float]] = []
+    for name in ["tot_arrival", "tot_service", "wasted"]:
+        series.append((name + "_{t}", 1 / c.T))
+    for n in range(c.N):
+        series.append((f"cwnd_{n},{{t}}", 1 / (c.T * c.N)))
+
+    rows: List[int] = []
+    cols: List[int] = []
+    vals: List[float] = []
+    n_rows = 0
+    for (fmt, weight) in series:
+        for t in range(1, c.T):
+            cur, prev = fmt.format(t=t), fmt.format(t=t-1)
+            if cur not in vars or prev not in vars:
+                continue
+            rows.extend([n_rows, n_rows])
+            cols.extend([vars[cur], vars[prev]])
+            vals.extend([weight ** (1 / p), -weight ** (1 / p)])
+            n_rows += 1
+    return csr_matrix((vals, (rows, cols)), shape=(n_rows, len(vars)))
+
+
+def check_simplifiable(c: ModelConfig):
+    ''' Raise a ValueError if `c` uses an encoding that indexes uninterpreted
+    functions with integer variables, since `eval_smt` can't evaluate those '''
+    if c.loss_detected_encoding == "frontier":
+        raise ValueError("Can't simplify with the 'frontier' "
+                         "loss_detected_encoding. Use 'pairwise'")
+    if c.calculate_qdel and c.qdel_encoding == "index":
+        raise ValueError("Can't simplify with the 'index' qdel_encoding. Use "
+                         "'matrix'")
+
+
 def simplify_solution(c: ModelConfig,
                       m: ModelDict,
-                      assertions: BoolRef) -> ModelDict:
+                      assertions: BoolRef,
+                      method: str = "SLSQP") -> ModelDict:
+    '''Find a solution close to `m` that satisfies the same linear
+    constraints but has straighter lines. `method` is passed to
+    scipy.optimize.minimize. "SLSQP" is the default. "trust-constr" keeps the
+    constraint matrices sparse and uses the exact Hessian of the (quadratic)
+    objective, so it solves the problem as a QP and scales better to
+    multi-flow, long-horizon models. "lp" uses `simplify_solution_lp`, whose
+    output is exactly feasible
+
+    '''
+    check_simplifiable(c)
+    if method == "lp":
+        return simplify_solution_lp(c, m, assertions)
+
     new_assertions, conds = substitute_if(m, assertions)
     anded = anded_constraints(m, And(new_assertions, And(conds)))
     constraints, vars = solver_constraints(anded)
-    init_values = np.asarray([m[v] for v in vars])
+    init_values = np.asarray([m[v] for v in vars], dtype=float)
 
     def constraint_fit(soln: np.ndarray, cons: List[LinearConstraint]) \
             -> float:
         ugap = np.concatenate((
-            np.dot(cons[0].A, soln) - cons[0].ub,
-            np.dot(cons[1].A, soln) - cons[1].ub))
+            cons[0].A @ soln - cons[0].ub,
+            cons[1].A @ soln - cons[1].ub))
         lgap = np.concatenate((
-            cons[0].lb - np.dot(cons[0].A, soln),
-            cons[1].lb - np.dot(cons[1].A, soln)))
-        for i in range(ugap.shape[0]):
-            if ugap[i] > 1e-5 or lgap[i] > 1e-5:
-                print("Found an unsatisfied constraint")
-                print(anded[i])
-                v = extract_vars(anded[i])
-                print([(x, float(m[x])) for x in v])
+            cons[0].lb - cons[0].A @ soln,
+            cons[1].lb - cons[1].A @ soln))
+        for i in np.nonzero((ugap > 1e-5) | (lgap > 1e-5))[0]:
+            print("Found an unsatisfied constraint")
+            print(anded[i])
+            v = extract_vars(anded[i])
+            print([(x, float(m[x])) for x in v])
     constraint_fit(init_values, constraints)
 
-    def score1(values: np.ndarray) -> float:
-        res = 0
-        for t in range(1, c.T):
-            res += (values[vars[f"tot_inp_{t}"]]
-                    - values[vars[f"tot_inp_{t-1}"]]) ** 2 / c.T
-            res += (values[vars[f"tot_out_{t}"]]
-                    - values[vars[f"tot_out_{t-1}"]]) ** 2 / c.T
-            res += (values[vars[f"wasted_{t}"]]
-                    - values[vars[f"wasted_{t-1}"]]) ** 2 / c.T
-            for n in range(c.N):
-                res += (values[vars[f"cwnd_{n},{t}"]]
-                        - values[vars[f"cwnd_{n},{t-1}"]]) ** 2 / (c.T * c.N)
-        return res
-
-    # Score for the new implementation
-    def score2(values: np.ndarray) -> float:
-        res = 0
-        for t in range(1, c.T):
-            res += (values[vars[f"tot_arrival_{t}"]]
-                    - values[vars[f"tot_arrival_{t-1}"]]) ** 2 / c.T
-            res += (values[vars[f"tot_service_{t}"]]
-                    - values[vars[f"tot_service_{t-1}"]]) ** 2 / c.T
-            res += (values[vars[f"wasted_{t}"]]
-                    - values[vars[f"wasted_{t-1}"]]) ** 2 / c.T
-            for n in range(c.N):
-                res += (values[vars[f"cwnd_{n},{t}"]]
-                        - values[vars[f"cwnd_{n},{t-1}"]]) ** 2 / (c.T * c.N)
-        return res
-
-    # Methods that work are "SLSQP" and "trust-constr"
-    soln = minimize(score2, init_values, constraints=constraints,
-                    method="SLSQP")
+    # Score is |D x|^2, which is quadratic with constant Hessian 2 D^T D
+    D = smoothness_operator(c, vars)
+    H = (2 * (D.T @ D)).tocsr()
+
+    def score(values: np.ndarray) -> float:
+        return float(np.sum((D @ values) ** 2))
+
+    def score_grad(values: np.ndarray) -> np.ndarray:
+        return H @ values
+
+    # scipy can't handle constraint matrices with no rows
+    nonempty = [x for x in constraints if x.A.shape[0] > 0]
+    if method == "trust-constr":
+        soln = minimize(score, init_values, jac=score_grad,
+                        hess=lambda _: H, constraints=nonempty,
+                        method=method)
+    else:
+        # Methods that work are "SLSQP" and "trust-constr"
+        soln = minimize(score, init_values, jac=score_grad,
+                        constraints=nonempty, method=method)
     constraint_fit(soln.x, constraints)
 
     res = copy(m)
@@ -454,3 +574,91 @@ def simplify_solution(c: ModelConfig,
                 res[f"loss_detected_{n},{t}"] = res[f"loss_detected_{n},{t-1}"]
 
     return res
+
+
+def face_point(anded: List[Expr], ineq: LinearConstraint, x: np.ndarray)\
+        -> ModelDict:
+    '''An exact point satisfying the constraints `anded`, on the face of the
+    polytope that the approximate point `x` lies on. `ineq` is the inequality
+    part of `solver_constraints(anded)` '''
+    s = Solver()
+    s.add(anded)
+    i_ineq = 0
+    for cons in anded:
+        if str(cons.decl()) == "==":
+            continue
+        # A strict inequality can't hold with equality. It is tight only
+        # because of the margin `solver_constraints` gives it
+        if ineq.ub[i_ineq] - ineq.A[i_ineq] @ x < 1e-7 \
+           and str(cons.decl()) in ["<=", ">="]:
+            lhs, rhs = cons.children()
+            s.add(lhs == rhs)
+        i_ineq += 1
+    if s.check() != sat:
+        # The numerically tight set was inconsistent. Any point in the
+        # polytope will do
+        s = Solver()
+        s.add(anded)
+        assert(s.check() == sat)
+    return model_to_dict(s.model())
+
+
+def simplify_solution_lp(c: ModelConfig,
+                         m: ModelDict,
+                         assertions: BoolRef) -> ModelDict:
+    '''Like `simplify_solution`, but minimizes the L1 smoothness score with a
+    linear program (HiGHS) over the same polytope. The LP solution is only
+    approximately feasible, so we convert it to exact rationals: first by
+    rounding, and if that breaks a constraint, by asking Z3 for a point
+    where the constraints tight at the LP optimum hold with equality. The
+    result is always verified with `eval_smt`; if we fail, `m` is returned
+    unchanged
+
+    '''
+    check_simplifiable(c)
+    new_assertions, conds = substitute_if(m, assertions)
+    anded = anded_constraints(m, And(new_assertions, And(conds)))
+    constraints, vars = solver_constraints(anded)
+    eq, ineq = constraints
+    n = len(vars)
+
+    # Minimize sum(u) subject to -u <= D x <= u. The LP variables are [x, u]
+    D = smoothness_operator(c, vars, p=1)
+    k = D.shape[0]
+    I_k = identity(k, format="csr")
+    A_ub = vstack([
+        hstack([ineq.A, csr_matrix((ineq.A.shape[0], k))]),
+        hstack([D, -I_k]),
+        hstack([-D, -I_k])]).tocsr()
+    b_ub = np.concatenate((ineq.ub, np.zeros(2 * k)))
+    A_eq = hstack([eq.A, csr_matrix((eq.A.shape[0], k))]).tocsr()
+    b_eq = (eq.lb + eq.ub) / 2
+    cost = np.concatenate((np.zeros(n), np.ones(k)))
+
+    has_eq = A_eq.shape[0] > 0
+    soln = linprog(cost, A_ub=A_ub, b_ub=b_ub,
+                   A_eq=A_eq if has_eq else None,
+                   b_eq=b_eq if has_eq else None,
+                   bounds=(None, None), method="highs")
+    print(f"Successful? {soln.success} Message: {soln.message}")
+    if not soln.success:
+        return m
+    x = soln.x[:n]
+
+    # Try the closest simple rational to each value first
+    res = copy(m)
+    for var in vars:
+        res[var] = Fraction(x[vars[var]]).limit_denominator(10**6)
+    if eval_smt(res, assertions):
+        return res
+
+    exact = face_point(anded, ineq, x)
+    res = copy(m)
+    for var in vars:
+        res[var] = exact[var]
+
+    feasible = eval_smt(res, assertions)
+    print(f"The solution found is feasible: {feasible}")
+    if not feasible:
+        return m
+    return res
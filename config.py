@@ -1,5 +1,5 @@
 import argparse
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 import z3
 
 
@@ -37,6 +37,37 @@ class ModelConfig:
     # Whether AIMD can additively increase irrespective of losses. If true, the
     # the algorithm is more like cubic and has interesting failure modes
     aimd_incr_irrespective: bool
+    # How to encode whether AIMD got enough acks to increase cwnd.
+    # "disjunction" considers every time cwnd may have last changed (O(T^3)
+    # terms per flow). "linear" tracks S at the last change (O(T))
+    aimd_incr_encoding: str
+    # How to encode when Copa may increase/decrease cwnd. "disjunction" has a
+    # boolean for every (flow, time, delay) and requires D = 1. "linear" works
+    # off the queueing delay at each timestep and requires the "index" qdel
+    # encoding
+    copa_encoding: str
+    # Number of RTTs over which BBR computes its max rate (10 in the spec)
+    bbr_max_R: int
+    # Number of RTTs in BBR's pacing gain cycle (8 in the spec)
+    bbr_cycle: int
+    # How to encode loss detection through dupacks. "pairwise" compares every
+    # pair of timesteps (O(T^2) constraints per flow). "frontier" tracks the
+    # last detectable timestep per time (O(T) constraints), but uses integer
+    # indices into uninterpreted functions, which clean_output cannot simplify
+    # (simplify_solution raises a ValueError)
+    loss_detected_encoding: str
+    # How to encode queueing delay when calculate_qdel is set. "matrix" has a
+    # boolean for every (t, dt) pair. "index" has one integer per timestep:
+    # the time at which the bytes being served were input. Like the
+    # "frontier" loss encoding, it indexes uninterpreted functions, so
+    # clean_output cannot simplify it (simplify_solution raises a ValueError)
+    qdel_encoding: str
+    # If N > 1, add constraints that order the flows by their initial state,
+    # so the solver doesn't explore every permutation of the same
+    # counter-example. Only sound if the query treats all flows alike (e.g.
+    # ask "some flow gets x more than another", not "flow 0 gets x more than
+    # flow 1")
+    symmetry_breaking: bool
 
     # These config variables are calculated automatically
     calculate_qdel: bool
@@ -57,7 +88,14 @@ class ModelConfig:
                  epsilon: str,
                  unsat_core: bool,
                  simplify: bool,
-                 aimd_incr_irrespective: bool = False):
+                 aimd_incr_irrespective: bool = False,
+                 loss_detected_encoding: str = "pairwise",
+                 qdel_encoding: str = "matrix",
+                 symmetry_breaking: bool = False,
+                 aimd_incr_encoding: str = "disjunction",
+                 copa_encoding: str = "disjunction",
+                 bbr_max_R: int = 4,
+                 bbr_cycle: int = 4):
         self.__dict__ = locals()
         self.calculate_qdel = cca in ["copa"] or N > 1
 
@@ -91,6 +129,29 @@ class ModelConfig:
         parser.add_argument("--unsat-core", action="store_true")
         parser.add_argument("--simplify", action="store_true")
         parser.add_argument("--aimd-incr-irrespective", action="store_true")
+        parser.add_argument(
+            "--loss-detected-encoding",
+            type=str,
+            default="pairwise",
+            choices=["pairwise", "frontier"])
+        parser.add_argument(
+            "--qdel-encoding",
+            type=str,
+            default="matrix",
+            choices=["matrix", "index"])
+        parser.add_argument("--symmetry-breaking", action="store_true")
+        parser.add_argument(
+            "--aimd-incr-encoding",
+            type=str,
+            default="disjunction",
+            choices=["disjunction", "linear"])
+        parser.add_argument(
+            "--copa-encoding",
+            type=str,
+            default="disjunction",
+            choices=["disjunction", "linear"])
+        parser.add_argument("--bbr-max-R", type=int, default=4)
+        parser.add_argument("--bbr-cycle", type=int, default=4)
 
         return parser
 
@@ -99,7 +160,14 @@ class ModelConfig:
         return cls(args.num_flows, args.D, args.rtt, args.time, args.rate,
                    args.buf_min, args.buf_max, args.dupacks, args.cca,
                    not args.no_compose, args.alpha, args.pacing, args.epsilon,
-                   args.unsat_core, args.simplify, args.aimd_incr_irrespective)
+                   args.unsat_core, args.simplify, args.aimd_incr_irrespective,
+                   args.loss_detected_encoding, args.qdel_encoding,
+                   args.symmetry_breaking, args.aimd_incr_encoding,
+                   args.copa_encoding, args.bbr_max_R, args.bbr_cycle)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ''' The parameters as a plain dict, e.g. for logging or hashing '''
+        return {k: v for k, v in self.__dict__.items() if k != "self"}
 
     @classmethod
     def default(cls):
@@ -0,0 +1,152 @@
+''' A k-induction engine for steady-state claims. Given a candidate invariant
+I(t) over the state at timestep t (cwnd, queue, undetected losses, ...), we
+prove that once a trace satisfies I it satisfies it forever by checking, for
+increasing k:
+
+* Base case: a trace that starts in an initial state satisfies I for the
+  first k timesteps
+* Inductive step: a trace where I holds at k consecutive timesteps satisfies
+  it at the next one
+
+By default, the initial states are those that satisfy I. Then the base case
+for k + 1 implies the inductive step for k, so k = 1 is as good as any. Pass a
+stronger `initial` condition for invariants that are only k-inductive from
+there
+
+The first `dur` timesteps of each trace are history that isn't constrained by
+I, since the CCA reacts to what happened up to c.R + c.D timesteps ago. Both
+cases are ordinary lemmas (see lemmas.py), so this replaces hand-picking T for
+each lemma '''
+
+import argparse
+from copy import copy
+from typing import Callable, Optional
+from z3 import And, BoolRef, Not, Or
+
+from config import ModelConfig
+from lemmas import Lemma
+from pyz3_utils import ModelDict, MySolver, run_query
+from variables import Variables
+
+# The invariant at timestep t
+Invariant = Callable[[ModelConfig, Variables, int], BoolRef]
+
+
+class InductionResult:
+    def __init__(self, verdict: str, k: Optional[int],
+                 counter_example: Optional[ModelDict] = None):
+        # 'proven', 'refuted' (the base case has a counter-example) or
+        # 'unknown' (not proven for any k up to the maximum)
+        self.verdict = verdict
+        # The k it was proven with, or whose base case failed
+        self.k = k
+        # The base case's counter-example, if refuted
+        self.counter_example = counter_example
+
+
+def no_assumptions(c: ModelConfig, s: MySolver, v: Variables):
+    pass
+
+
+def base_case(c: ModelConfig, invariant: Invariant, initial: Invariant,
+              assumptions: Callable[[ModelConfig, MySolver, Variables], None],
+              k: int, dur: int) -> Lemma:
+    ''' `initial` at timestep dur implies I at dur..dur+k-1 '''
+    cfg = copy(c)
+    cfg.T = dur + k
+
+    def base_assumptions(c, s, v):
+        assumptions(c, s, v)
+        s.add(initial(c, v, dur))
+    return Lemma(
+        f"Base case (k = {k})", cfg, base_assumptions,
+        lambda c, v: Or([Not(invariant(c, v, t))
+                         for t in range(dur, dur + k)]))
+
+
+def step_case(c: ModelConfig, invariant: Invariant,
+              assumptions: Callable[[ModelConfig, MySolver, Variables], None],
+              k: int, dur: int) -> Lemma:
+    ''' I at timesteps dur..dur+k-1 implies I at dur+k '''
+    cfg = copy(c)
+    cfg.T = dur + k + 1
+
+    def step_assumptions(c, s, v):
+        assumptions(c, s, v)
+        s.add(And([invariant(c, v, t) for t in range(dur, dur + k)]))
+    return Lemma(
+        f"Inductive step (k = {k})", cfg, step_assumptions,
+        lambda c, v: Not(invariant(c, v, dur + k)))
+
+
+def prove_invariant(c: ModelConfig, invariant: Invariant,
+                    assumptions: Optional[Callable[
+                        [ModelConfig, MySolver, Variables], None]] = None,
+                    dur: int = 0, max_k: int = 10, timeout: float = 60,
+                    initial: Optional[Invariant] = None) -> InductionResult:
+    '''Try to prove `invariant` by k-induction for k = 1..max_k. `assumptions`
+    are added to both cases (e.g. bounds on alpha). `initial` is the
+    condition the base case starts from (default: the invariant). If the base
+    case fails, the invariant is false and we stop early
+
+    '''
+    if assumptions is None:
+        assumptions = no_assumptions
+
+    for k in range(1, max_k + 1):
+        # The base case is trivial for k = 1 if we start from the invariant
+        if k > 1 or initial is not None:
+            base = base_case(c, invariant,
+                             invariant if initial is None else initial,
+                             assumptions, k, dur)
+            s, v = base.make_solver()
+            qres = run_query(base.cfg, s, v, timeout)
+            print(f"{str(qres.satisfiable):<8} {base.name}")
+            if str(qres.satisfiable) == "sat":
+                print("The invariant does not hold. Counter-example found in "
+                      "the base case")
+                return InductionResult("refuted", k, qres.model)
+            base_proven = str(qres.satisfiable) == "unsat"
+        else:
+            base_proven = True
+
+        step = step_case(c, invariant, assumptions, k, dur)
+        s, v = step.make_solver()
+        qres = run_query(step.cfg, s, v, timeout)
+        print(f"{str(qres.satisfiable):<8} {step.name}")
+        if base_proven and str(qres.satisfiable) == "unsat":
+            print(f"Proven by {k}-induction")
+            return InductionResult("proven", k)
+    print(f"Could not prove the invariant with k <= {max_k}")
+    return InductionResult("unknown", None)
+
+
+if __name__ == "__main__":
+    from aimd_proofs import max_cwnd, max_undet
+
+    parser = argparse.ArgumentParser(
+        description="Prove AIMD's steady state invariant by k-induction")
+    parser.add_argument("--max-k", type=int, default=10)
+    # Timesteps of history before the invariant is first assumed. Defaults
+    # to c.R + c.D
+    parser.add_argument("--dur", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    # The steady state from aimd_proofs: cwnd <= max_cwnd and undetected
+    # losses <= max_undet
+    c = ModelConfig.default()
+    c.cca = "aimd"
+    c.buf_min = 1
+    c.buf_max = 1
+
+    def steady_state(c: ModelConfig, v: Variables, t: int) -> BoolRef:
+        return And(v.c_f[0][t] <= max_cwnd(c, v),
+                   v.L_f[0][t] - v.Ld_f[0][t] <= max_undet(c, v))
+
+    def small_alpha(c: ModelConfig, s: MySolver, v: Variables):
+        s.add(v.alpha < 1 / 3)
+
+    dur = c.R + c.D if args.dur is None else args.dur
+    prove_invariant(c, steady_state, small_alpha, dur=dur, max_k=args.max_k,
+                    timeout=args.timeout)
@@ -0,0 +1,97 @@
+''' A registry of lemmas and a runner that checks them in parallel. Each lemma
+has the form p -> q, which we prove by showing p & ~q is unsatisfiable (see
+README). Lemmas are independent queries, so they can be checked
+concurrently, and lemmas whose encoding hasn't changed since they were last
+proven are skipped using the QueryCache '''
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import copy
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from z3 import BoolRef
+
+from config import ModelConfig
+from model import make_solver
+from pyz3_utils import MySolver, run_query
+from query_cache import QueryCache
+from variables import Variables
+
+
+class Lemma:
+    def __init__(self,
+                 name: str,
+                 cfg: ModelConfig,
+                 assumptions: Callable[[ModelConfig, MySolver, Variables],
+                                       None],
+                 negated_conclusion: Callable[[ModelConfig, Variables],
+                                              BoolRef]):
+        # Human readable description. Must be unique within a registry
+        self.name = name
+        # Each lemma gets its own copy, so registries can reuse one config
+        self.cfg = copy(cfg)
+        # Adds p to the solver. This can add constraints directly (e.g.
+        # `min_send_quantum`), not just return them
+        self.assumptions = assumptions
+        # Returns ~q
+        self.negated_conclusion = negated_conclusion
+
+    def make_solver(self) -> Tuple[MySolver, Variables]:
+        s, v, _ = make_solver(self.cfg)
+        self.assumptions(self.cfg, s, v)
+        s.add(self.negated_conclusion(self.cfg, v))
+        return (s, v)
+
+
+# A module-level function returning a list of lemmas. We pass the registry
+# (and not the lemmas) to worker processes, since lemmas contain lambdas which
+# cannot be pickled
+Registry = Callable[[], List[Lemma]]
+
+
+def check_lemma(registry: Registry, name: str, timeout: float,
+                cache_fname: Optional[str]) -> Tuple[str, str, float, bool]:
+    ''' Check one lemma. Returns (name, satisfiable, solve time, whether the
+    result came from the cache). This is what runs inside the worker '''
+    lemmas = {lemma.name: lemma for lemma in registry()}
+    lemma = lemmas[name]
+    s, v = lemma.make_solver()
+    if cache_fname is None:
+        start = time.time()
+        qres = run_query(lemma.cfg, s, v, timeout)
+        return (name, str(qres.satisfiable), time.time() - start, False)
+
+    cres = QueryCache(cache_fname).run_query(lemma.cfg, s, v, timeout)
+    return (name, cres.satisfiable, cres.solve_time, cres.from_cache)
+
+
+def prove_lemmas(registry: Registry, timeout: float,
+                 processes: Optional[int] = None,
+                 cache_fname: Optional[str] = "cached/results.db") -> bool:
+    '''Check every lemma in `registry` on a pool of `processes` workers
+    (default: one per core) and print a table with the result and time for
+    each. Returns true iff all lemmas were proven (i.e. were 'unsat'). Pass
+    cache_fname=None to always re-check
+
+    '''
+    names = [lemma.name for lemma in registry()]
+    assert len(set(names)) == len(names), "Lemma names must be unique"
+
+    results: Dict[str, Tuple[str, str, float, bool]] = {}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(check_lemma, registry, name, timeout,
+                               cache_fname)
+                   for name in names]
+        for fut in as_completed(futures):
+            name, satisfiable, solve_time, cached = fut.result()
+            results[name] = (name, satisfiable, solve_time, cached)
+            print(f"{satisfiable:<8} {solve_time:>8.1f}s "
+                  f"{'(cached) ' if cached else ''}{name}")
+
+    print("\n", "=" * 30, "\n")
+    print("{:<8} {:>9} {:<8} {}".format("result", "time", "cached", "lemma"))
+    for name in names:
+        _, satisfiable, solve_time, cached = results[name]
+        print("{:<8} {:>8.1f}s {:<8} {}".format(
+            satisfiable, solve_time, str(cached), name))
+
+    return all([results[name][1] == "unsat" for name in names])
@@ -1,17 +1,19 @@
-from typing import Optional, Tuple
-from z3 import And, Sum, Implies, Or, Not, If
+from typing import List, Optional, Tuple
+from z3 import And, ArithRef, BoolRef, FuncDeclRef, Function, Sum, Implies, \
+    Or, Not, If, IntSort, RealSort
 
 from cca_aimd import cca_aimd
 from cca_bbr import cca_bbr
 from cca_copa import cca_copa
 from cca_matchaction import cca_ma, MAVariables
 from config import ModelConfig
+from profiling import profile_of
 from pyz3_utils import MySolver
 from variables import Variables
 
 
-def monotone(c: ModelConfig, s: MySolver, v: Variables):
-    for t in range(1, c.T):
+def monotone(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
+    for t in range(max(1, t0), c.T):
         for n in range(c.N):
             s.add(v.A_f[n][t] >= v.A_f[n][t - 1])
             s.add(v.Ld_f[n][t] >= v.Ld_f[n][t - 1])
@@ -23,7 +25,9 @@ def monotone(c: ModelConfig, s: MySolver, v: Variables):
         s.add(v.W[t] >= v.W[t - 1])
 
 
-def initial(c: ModelConfig, s: MySolver, v: Variables):
+def initial(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
+    if t0 > 0:
+        return
     for n in range(c.N):
         # Making these positive actually matters. What the hell is negative
         # rate or loss?
@@ -37,16 +41,16 @@ def initial(c: ModelConfig, s: MySolver, v: Variables):
         s.add(v.S_f[n][0] == 0)
 
 
-def relate_tot(c: ModelConfig, s: MySolver, v: Variables):
+def relate_tot(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
     ''' Relate total values to per-flow values '''
-    for t in range(c.T):
+    for t in range(t0, c.T):
         s.add(v.A[t] == Sum([v.A_f[n][t] for n in range(c.N)]))
         s.add(v.L[t] == Sum([v.L_f[n][t] for n in range(c.N)]))
         s.add(v.S[t] == Sum([v.S_f[n][t] for n in range(c.N)]))
 
 
-def network(c: ModelConfig, s: MySolver, v: Variables):
-    for t in range(c.T):
+def network(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
+    for t in range(t0, c.T):
         for n in range(c.N):
             s.add(v.S_f[n][t] <= v.A_f[n][t] - v.L_f[n][t])
 
@@ -90,22 +94,81 @@ def network(c: ModelConfig, s: MySolver, v: Variables):
             s.add(v.A[t] - v.L[t] <= c.C * t - v.W[t] + c.buf_max)
 
 
-def loss_detected(c: ModelConfig, s: MySolver, v: Variables):
+def indexed(s: MySolver, name: str, vals: List[ArithRef], t0: int = 0)\
+        -> FuncDeclRef:
+    ''' Returns an uninterpreted function f with f(t) == vals[t], so that
+    vals can be indexed by an integer variable. Only constrains t >= t0 '''
+    # Declared with z3 directly, since MySolver only declares constants
+    f = Function(name, IntSort(), RealSort())
+    for t in range(t0, len(vals)):
+        s.add(f(t) == vals[t])
+    return f
+
+
+def loss_detected_frontier(c: ModelConfig, s: MySolver, v: Variables,
+                           t0: int = 0):
+    '''Linear-size version of the dupack constraints in `loss_detected`.
+    Since A - L is monotone, the timesteps whose losses are detectable at t
+    form a prefix 0..frontier. And since L is monotone, bounding Ld by L at
+    the end of that prefix and just after it implies all the pairwise
+    constraints. We index A - L and L through uninterpreted functions that
+    agree with them at every timestep. Requires the `monotone` constraints.
+
+    '''
     for n in range(c.N):
-        for t in range(c.T):
-            for dt in range(c.T):
-                if t - c.R - dt < 0:
-                    continue
-                # Loss is detectable through dupacks
-                detectable = v.A_f[n][t-c.R-dt] - v.L_f[n][t-c.R-dt]\
-                    + v.dupacks <= v.S_f[n][t-c.R]
+        inp = indexed(s, f"{v.pre}ld_inp_{n}",
+                      [v.A_f[n][t] - v.L_f[n][t] for t in range(c.T)], t0)
+        lost = indexed(s, f"{v.pre}ld_lost_{n}", v.L_f[n], t0)
+
+        for t in range(max(c.R, t0), c.T):
+            # The last timestep whose losses are detectable through dupacks at
+            # time t. -1 if there is none
+            frontier = s.Int(f"{v.pre}ld_frontier_{n},{t}")
+            last = t - c.R
+            s.add(frontier >= -1)
+            s.add(frontier <= last)
+            s.add(Implies(frontier >= 0,
+                          inp(frontier) + v.dupacks <= v.S_f[n][last]))
+            s.add(Implies(frontier < last,
+                          inp(frontier + 1) + v.dupacks > v.S_f[n][last]))
+            if t > c.R:
+                # Implied since S is monotone, but helps the solver
+                s.add(frontier >= s.Int(f"{v.pre}ld_frontier_{n},{t-1}"))
+
+            s.add(Implies(And(Not(v.timeout_f[n][t]), frontier >= 0),
+                          v.Ld_f[n][t] >= lost(frontier)))
+            s.add(Implies(And(Not(v.timeout_f[n][t]), frontier < last),
+                          v.Ld_f[n][t] <= lost(frontier + 1)))
+
+
+def loss_detected(c: ModelConfig, s: MySolver, v: Variables,
+                  t0: Optional[int] = None):
+    '''Adds the loss detection constraints. If t0 is given, only those for
+    timesteps t0 onward are added, and the constraints that depend on the
+    horizon (see `horizon_dependent`) are left out
 
-                s.add(
-                    Implies(And(Not(v.timeout_f[n][t]), detectable),
-                            v.Ld_f[n][t] >= v.L_f[n][t - c.R - dt]))
-                s.add(
-                    Implies(And(Not(v.timeout_f[n][t]), Not(detectable)),
-                            v.Ld_f[n][t] <= v.L_f[n][t - c.R - dt]))
+    '''
+    if c.loss_detected_encoding == "frontier":
+        loss_detected_frontier(c, s, v, t0 or 0)
+    else:
+        assert c.loss_detected_encoding == "pairwise"
+
+    for n in range(c.N):
+        for t in range(t0 or 0, c.T):
+            if c.loss_detected_encoding == "pairwise":
+                for dt in range(c.T):
+                    if t - c.R - dt < 0:
+                        continue
+                    # Loss is detectable through dupacks
+                    detectable = v.A_f[n][t-c.R-dt] - v.L_f[n][t-c.R-dt]\
+                        + v.dupacks <= v.S_f[n][t-c.R]
+
+                    s.add(
+                        Implies(And(Not(v.timeout_f[n][t]), detectable),
+                                v.Ld_f[n][t] >= v.L_f[n][t - c.R - dt]))
+                    s.add(
+                        Implies(And(Not(v.timeout_f[n][t]), Not(detectable)),
+                                v.Ld_f[n][t] <= v.L_f[n][t - c.R - dt]))
 
             # We implement an RTO scheme that magically triggers when S(t) ==
             # A(t) - L(t). While this is not implementable in reality, it is
@@ -132,10 +195,56 @@ def loss_detected(c: ModelConfig, s: MySolver, v: Variables):
                     v.L_f[n][t - c.R]))
             s.add(Implies(v.timeout_f[n][t], v.Ld_f[n][t] == v.L_f[n][t]))
 
+            if t >= c.R or t0 is None:
+                s.add(v.Ld_f[n][t] <= v.L_f[n][t - c.R])
+
+
+def horizon_dependent(c: ModelConfig, s: MySolver, v: Variables):
+    '''Constraints that refer to the last timesteps through negative indices,
+    and so change when the horizon c.T is extended. These are left out when
+    building the solver incrementally (t0 is not None in `make_solver`), and
+    must be added for each horizon separately
+
+    '''
+    for n in range(c.N):
+        for t in range(min(c.R, c.T)):
+            # For t < c.R, this wraps around to the end
             s.add(v.Ld_f[n][t] <= v.L_f[n][t - c.R])
 
 
-def calculate_qdel(c: ModelConfig, s: MySolver, v: Variables):
+def calculate_qdel_index(c: ModelConfig, s: MySolver, v: Variables,
+                         t0: int = 0):
+    ''' Like `calculate_qdel`, but for the compact "index" encoding '''
+    inp = indexed(s, f"{v.pre}qdel_inp",
+                  [v.A[t] - v.L[t] for t in range(c.T)], t0)
+    for t in range(t0, c.T):
+        s.add(v.qdel_index[t] >= 0)
+        s.add(v.qdel_index[t] <= t)
+        # The bytes exiting at t were input at the first time at which
+        # cumulative input crossed S[t]
+        fresh = And(inp(v.qdel_index[t]) >= v.S[t],
+                    Or(v.qdel_index[t] == 0,
+                       inp(v.qdel_index[t] - 1) < v.S[t]))
+        if t == 0:
+            s.add(fresh)
+        else:
+            # If no new bytes exited, we default to the delay of the last
+            # exiting byte, as in the "matrix" encoding. So the index moves
+            # forward with t, unless the delay is unknown
+            s.add(If(v.S[t] != v.S[t - 1],
+                     fresh,
+                     v.qdel_index[t] == If(v.qdel_index[t - 1] == 0, 0,
+                                           v.qdel_index[t - 1] + 1)))
+
+
+def calculate_qdel(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
+    if c.qdel_encoding == "index":
+        calculate_qdel_index(c, s, v, t0)
+        return
+    assert c.qdel_encoding == "matrix"
+    # The t = 0 and dt = t cases below wrap around to the last timestep
+    assert t0 == 0, "Use the 'index' qdel encoding to extend the horizon"
+
     # Figure out the time when the bytes being output at time t were
     # first input
     for t in range(c.T):
@@ -157,8 +266,16 @@ def calculate_qdel(c: ModelConfig, s: MySolver, v: Variables):
                     Not(v.qdel[t][t - 1])))
 
 
-def multi_flows(c: ModelConfig, s: MySolver, v: Variables):
+def multi_flows(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
     assert (c.calculate_qdel)
+    if c.qdel_encoding == "index":
+        for n in range(c.N):
+            arrival = indexed(s, f"{v.pre}qdel_arrival_{n}", v.A_f[n], t0)
+            for t in range(t0, c.T):
+                s.add(Implies(v.qdel_index[t] >= 1,
+                              v.S_f[n][t] > arrival(v.qdel_index[t] - 1)))
+        return
+
     for t in range(c.T):
         for n in range(c.N):
             for dt in range(c.T):
@@ -168,8 +285,31 @@ def multi_flows(c: ModelConfig, s: MySolver, v: Variables):
                     Implies(v.qdel[t][dt], v.S_f[n][t] > v.A_f[n][t - dt - 1]))
 
 
-def epsilon_alpha(c: ModelConfig, s: MySolver, v: Variables):
-    if not c.compose:
+def lex_leq(xs: List[ArithRef], ys: List[ArithRef]) -> BoolRef:
+    ''' xs <= ys in lexicographic order '''
+    assert len(xs) == len(ys) and len(xs) > 0
+    res = xs[-1] <= ys[-1]
+    for (x, y) in reversed(list(zip(xs[:-1], ys[:-1]))):
+        res = Or(x < y, And(x == y, res))
+    return res
+
+
+def break_symmetry(c: ModelConfig, s: MySolver, v: Variables):
+    '''All flows run the same CCA, so any permutation of the flows in a
+    counter-example is also a counter-example. Pick the one where flows are
+    sorted by their initial state. See `ModelConfig.symmetry_breaking` for
+    when this is sound
+
+    '''
+    def state(n: int) -> List[ArithRef]:
+        return [v.c_f[n][0], v.A_f[n][0], v.L_f[n][0], v.Ld_f[n][0],
+                v.r_f[n][0]]
+    for n in range(1, c.N):
+        s.add(lex_leq(state(n - 1), state(n)))
+
+
+def epsilon_alpha(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
+    if not c.compose and t0 == 0:
         if c.epsilon == "zero":
             s.add(v.epsilon == 0)
         elif c.epsilon == "lt_alpha":
@@ -182,9 +322,10 @@ def epsilon_alpha(c: ModelConfig, s: MySolver, v: Variables):
             assert (False)
 
 
-def cwnd_rate_arrival(c: ModelConfig, s: MySolver, v: Variables):
+def cwnd_rate_arrival(c: ModelConfig, s: MySolver, v: Variables,
+                      t0: int = 0):
     for n in range(c.N):
-        for t in range(c.T):
+        for t in range(t0, c.T):
             if t >= c.R:
                 assert (c.R >= 1)
                 # Arrival due to cwnd
@@ -215,9 +356,9 @@ def min_send_quantum(c: ModelConfig, s: MySolver, v: Variables):
                    v.S_f[n][t - 1] + v.alpha <= v.S_f[n][t]))
 
 
-def cca_const(c: ModelConfig, s: MySolver, v: Variables):
+def cca_const(c: ModelConfig, s: MySolver, v: Variables, t0: int = 0):
     for n in range(c.N):
-        for t in range(c.T):
+        for t in range(t0, c.T):
             s.add(v.c_f[n][t] == v.alpha)
 
             if c.pacing:
@@ -228,43 +369,75 @@ def cca_const(c: ModelConfig, s: MySolver, v: Variables):
 
 def make_solver(c: ModelConfig,
                 s: Optional[MySolver] = None,
-                v: Optional[Variables] = None) -> Tuple[MySolver, Variables, Optional[MAVariables]]:
+                v: Optional[Variables] = None,
+                t0: Optional[int] = None) -> Tuple[MySolver, Variables, Optional[MAVariables]]:
+    '''Encode the model for timesteps 0..c.T-1. To build the solver
+    incrementally, pass t0. Then `s` and `v` (if given) must already encode
+    timesteps 0..t0-1 (from a previous call with c.T = t0), and only the
+    constraints for timesteps t0..c.T-1 are added. In this mode
+    `horizon_dependent` constraints are not added, since they change with
+    c.T; the caller must add them for each horizon (see `bmc.py`).
+
+    The time and size of each constraint family is recorded in `s.profile`
+    (see profiling.py)
+
+    '''
     if s is None:
         s = MySolver()
-    if v is None:
-        v = Variables(c, s)
-
-    if c.unsat_core:
+    start = t0 or 0
+    if c.unsat_core and start == 0:
         s.set(unsat_core=True)
 
-    monotone(c, s, v)
-    initial(c, s, v)
-    relate_tot(c, s, v)
-    network(c, s, v)
-    loss_detected(c, s, v)
-    epsilon_alpha(c, s, v)
+    # Time and size of each constraint family, for profiling
+    prof = profile_of(s)
+    with prof.family("variables", s):
+        if v is None:
+            v = Variables(c, s)
+        elif t0 is not None:
+            v.alloc_timesteps(c, s)
+    with prof.family("monotone", s):
+        monotone(c, s, v, start)
+    with prof.family("initial", s):
+        initial(c, s, v, start)
+    with prof.family("relate_tot", s):
+        relate_tot(c, s, v, start)
+    with prof.family("network", s):
+        network(c, s, v, start)
+    with prof.family("loss_detected", s):
+        loss_detected(c, s, v, t0)
+    with prof.family("epsilon_alpha", s):
+        epsilon_alpha(c, s, v, start)
     if c.calculate_qdel:
-        calculate_qdel(c, s, v)
+        with prof.family("calculate_qdel", s):
+            calculate_qdel(c, s, v, start)
     if c.N > 1:
         assert (c.calculate_qdel)
-        multi_flows(c, s, v)
-    cwnd_rate_arrival(c, s, v)
-
-    if c.cca == "const":
-        cca_const(c, s, v)
-    elif c.cca == "aimd":
-        cca_aimd(c, s, v)
-    elif c.cca == "bbr":
-        cca_bbr(c, s, v)
-    elif c.cca == "copa":
-        cca_copa(c, s, v)
-    elif c.cca == "cca_ma":
-        cv = cca_ma(c, s, v)
-        return (s, v, cv)
-    elif c.cca == "any":
-        pass
-    else:
-        assert(False)
+        with prof.family("multi_flows", s):
+            multi_flows(c, s, v, start)
+        if c.symmetry_breaking and start == 0:
+            with prof.family("symmetry_breaking", s):
+                break_symmetry(c, s, v)
+    with prof.family("cwnd_rate_arrival", s):
+        cwnd_rate_arrival(c, s, v, start)
+
+    with prof.family(f"cca_{c.cca}", s):
+        if c.cca == "const":
+            cca_const(c, s, v, start)
+        elif c.cca == "aimd":
+            cca_aimd(c, s, v, start)
+        elif c.cca == "bbr":
+            cca_bbr(c, s, v, start)
+        elif c.cca == "copa":
+            cca_copa(c, s, v, start)
+        elif c.cca == "cca_ma":
+            assert start == 0, \
+                "cca_ma does not support extending the horizon"
+            cv = cca_ma(c, s, v)
+            return (s, v, cv)
+        elif c.cca == "any":
+            pass
+        else:
+            assert(False)
 
     return (s, v, None)
 
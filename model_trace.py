@@ -0,0 +1,161 @@
+''' A structured view of a model: NumPy arrays for each time series, built in
+one pass over the ModelDict. Plotting and analysis code should use this rather
+than formatting variable names and looking them up one at a time '''
+
+from fractions import Fraction
+import numpy as np
+import re
+from typing import Any, Dict, Optional, Tuple, Union
+
+from config import ModelConfig
+from pyz3_utils import ModelDict
+
+# Names look like "<prefix>__<base>_<i>,<j>,..." (see variables.Variables).
+# The prefix is optional and names without indices are scalars
+NAME_RE = re.compile(
+    r"^(?:(?P<pre>.+?)__)?(?P<base>.+?)(?:_(?P<idx>\d+(?:,\d+)*))?$")
+
+
+def parse_name(name: str) -> Tuple[str, str, Tuple[int, ...]]:
+    ''' Split a variable name into (prefix, base name, indices). E.g.
+    "f1__cwnd_0,3" -> ("f1", "cwnd", (0, 3)) and "alpha" -> ("", "alpha", ())
+    '''
+    match = NAME_RE.match(name)
+    assert match is not None
+    pre = match.group("pre") or ""
+    idx = match.group("idx")
+    if idx is None:
+        return (pre, match.group("base"), ())
+    return (pre, match.group("base"), tuple(int(i) for i in idx.split(",")))
+
+
+class Trace:
+    ''' The time series in a model as arrays. Per-flow series have shape (N, T)
+    and totals have shape (T,), with the same attribute names as in
+    `Variables`. Everything else (CCA internals, qdel etc.) is in `arrays`,
+    keyed by base name and then by number of indices (a few names, like BBR's
+    max_rate, are used with more than one). Un-indexed values are in
+    `scalars`. Entries missing from the model are NaN (None if exact) '''
+
+    # (attribute, base name) for the standard series
+    per_flow = [("A_f", "arrival"), ("S_f", "service"), ("L_f", "losts"),
+                ("Ld_f", "loss_detected"), ("c_f", "cwnd"), ("r_f", "rate"),
+                ("timeout_f", "timeout")]
+    totals = [("A", "tot_arrival"), ("S", "tot_service"), ("L", "tot_lost"),
+              ("W", "wasted")]
+
+    def __init__(self, c: ModelConfig, m: ModelDict, pre: str = "",
+                 exact: bool = False):
+        self.c = c
+        # If true, values are kept as Fractions in object arrays. Else they
+        # are converted to float
+        self.exact = exact
+
+        groups: Dict[str, Dict[int, Dict[Tuple[int, ...],
+                                         Union[Fraction, bool]]]] = {}
+        self.scalars: Dict[str, Union[Fraction, bool]] = {}
+        for name, val in m.items():
+            name_pre, base, idx = parse_name(name)
+            if name_pre != pre:
+                continue
+            if len(idx) == 0:
+                self.scalars[base] = val
+            else:
+                groups.setdefault(base, {}).setdefault(len(idx), {})[idx] \
+                    = val
+        self.arrays: Dict[str, Dict[int, np.ndarray]] = {
+            base: {k: self.to_array(entries) for (k, entries) in by_k.items()}
+            for (base, by_k) in groups.items()}
+
+        for (attr, base) in self.per_flow:
+            self.__dict__[attr] = self.get(base, (c.N, c.T))
+        for (attr, base) in self.totals:
+            self.__dict__[attr] = self.get(base, (c.T,))
+
+    def missing(self) -> Any:
+        return None if self.exact else np.nan
+
+    def to_array(self, entries: Dict[Tuple[int, ...], Union[Fraction, bool]])\
+            -> np.ndarray:
+        idx = np.array(list(entries.keys()))
+        vals = list(entries.values())
+        shape = tuple(idx.max(axis=0) + 1)
+        if all([type(x) is bool for x in vals]):
+            res = np.zeros(shape, dtype=bool)
+        elif self.exact:
+            res = np.full(shape, None, dtype=object)
+        else:
+            res = np.full(shape, np.nan)
+            vals = [float(x) for x in vals]
+        res[tuple(idx.T)] = vals
+        return res
+
+    def get(self, base: str, shape: Optional[Tuple[int, ...]] = None)\
+            -> np.ndarray:
+        ''' The array for `base`, padded (or truncated) to `shape` if given.
+        If `base` isn't in the model with that many indices, all entries are
+        missing. Without `shape`, returns the one with the fewest indices '''
+        if shape is None:
+            return self.arrays[base][min(self.arrays[base].keys())]
+        if len(shape) not in self.arrays.get(base, {}):
+            return np.full(shape, self.missing(),
+                           dtype=object if self.exact else float)
+        arr = self.arrays[base][len(shape)]
+        if arr.shape == shape:
+            return arr
+        res = np.full(shape, False if arr.dtype == bool else self.missing(),
+                      dtype=arr.dtype)
+        overlap = tuple(slice(0, min(a, b)) for (a, b) in zip(shape, arr.shape))
+        res[overlap] = arr[overlap]
+        return res
+
+    def scalar(self, name: str, default: Any = None) -> Any:
+        ''' A value that isn't indexed by time, e.g. alpha '''
+        return self.scalars.get(name, default)
+
+    def qdel_range(self, per_flow: bool = False)\
+            -> Tuple[np.ndarray, np.ndarray]:
+        ''' Queueing delay bounds (see `qdel_range`) computed from the totals,
+        with shape (T,), or from each flow's own curves, with shape (N, T) '''
+        if per_flow:
+            return qdel_range(self.A_f - self.L_f, self.S_f)
+        return qdel_range(self.A - self.L, self.S)
+
+
+def qdel_range(inp: np.ndarray, out: np.ndarray)\
+        -> Tuple[np.ndarray, np.ndarray]:
+    '''Bounds on the queueing delay of the bytes leaving the queue at each
+    timestep, given cumulative bytes accepted into (`inp`, e.g. A - L) and
+    served from (`out`, e.g. S) the queue. Both have shape (..., T); the
+    leading dimensions (e.g. flows) are handled independently. Returns
+    (low, high) of the same shape. high is inf where the bytes may have
+    entered before t=0. If nothing is served at t, we use the delay of the
+    last bytes served, as in `Variables.qdel`.
+
+    The bytes served by time t entered at the first time u with inp[u] >=
+    out[t], which we find with a binary search since inp is non-decreasing.
+    Equality matters here, so use exact values (`Trace(..., exact=True)`)
+
+    '''
+    assert inp.shape == out.shape
+    T = inp.shape[-1]
+    low = np.zeros(inp.shape)
+    high = np.zeros(inp.shape)
+    times = np.arange(T)
+    for idx in np.ndindex(*inp.shape[:-1]):
+        i, o = inp[idx], out[idx]
+        u = np.searchsorted(i, o, side="left")
+        assert np.all(u <= times), "Served more bytes than were input"
+        hit = i[u] == o
+        dt = times - u
+        lo = dt.astype(float)
+        hi = np.where(hit, dt, dt + 1).astype(float)
+        # If u == 0, the bytes may have been input before t=0
+        hi[(u == 0) & ~hit] = np.inf
+
+        # Carry forward the last value when nothing was served
+        served = np.concatenate(([True], o[1:] != o[:-1]))
+        src = np.maximum.accumulate(np.where(served, times, 0))
+        low[idx] = lo[src]
+        high[idx] = hi[src]
+    return (low, high)
@@ -3,40 +3,25 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pickle as pkl
 import sys
-from typing import List, Optional, Tuple, Union
+from typing import Any, List, Optional
 
 from pyz3_utils import QueryResult
 from config import ModelConfig
+from model_trace import Trace
 from utils import ModelDict
 from variables import VariableNames
 
 
-def plot_model(m: ModelDict, c: ModelConfig, v: VariableNames):
-    def to_arr(names: Union[List[str], List[List[str]], str],
-               n: Optional[int] = None, frac=False) -> np.ndarray:
-        if type(names) == str:
-            # Sometimes name is a str, for instance when it is an internal CCA
-            # variable and not available in Variables. In this case, we
-            # directly convert to list
-            if n is None:
-                names = [f"{names}_{t}" for t in range(c.T)]
-            else:
-                names = [f"{names}_{n},{t}" for t in range(c.T)]
-        else:
-            if n is not None:
-                assert type(names[0]) == list
-                names = names[n]
-            else:
-                assert type(names[0]) == str
-        res = []
-        for n in names:
-            if n in m:
-                res.append(m[n])
-            else:
-                res.append(-1)
-        if frac:
-            return res
-        return np.array(res)
+def plot_model(m: ModelDict, c: ModelConfig, v: VariableNames,
+               out_fname: Optional[str] = None,
+               show: bool = True):
+    ''' Print the model and plot it. The plot is saved to `out_fname` (format
+    inferred from the extension) unless it is None, and shown interactively
+    if `show` is true '''
+    # Exact values for the queueing delay calculation below, and floats for
+    # plotting
+    exact = Trace(c, m, exact=True)
+    tr = Trace(c, m)
 
     # Print the constants we picked
     # if c.dupacks is None:
@@ -69,46 +54,53 @@ def plot_model(m: ModelDict, c: ModelConfig, v: VariableNames):
     times = [t for t in range(c.T)]
     ct = np.asarray([c.C * t for t in range(c.T)])
 
-    ax1.plot(times, ct - np.asarray(v.W),
+    ax1.plot(times, ct - tr.W,
              color='black', marker='o', label='Bound', linewidth=3)
-    ax1.plot(times[c.D:], (ct - to_arr("wasted"))[:-c.D],
+    ax1.plot(times[c.D:], (ct - tr.W)[:-c.D],
              color='black', marker='o', linewidth=3)
-    ax1.plot(times, np.asarray(v.S),
+    ax1.plot(times, tr.S,
              color='red', marker='o', label='Total Service')
-    ax1.plot(times, np.asarray(v.A),
+    ax1.plot(times, tr.A,
              color='blue', marker='o', label='Total Arrival')
-    ax1.plot(times, np.asarray(v.A) - np.asarray(v.L),
+    ax1.plot(times, tr.A - tr.L,
              color='lightblue', marker='o', label='Total Arrival Accepted')
 
     # Print incr/decr allowed
     if c.cca == "copa":
         print("Copa queueing delay calculation. Format [incr/decr/qdel]")
+        incr = exact.get("incr_allowed", (c.N, c.T, c.T))
+        decr = exact.get("decr_allowed", (c.N, c.T, c.T))
+        if "qdel" in exact.arrays:
+            qdel = exact.get("qdel", (c.T, c.T))
+        else:
+            # The "index" queueing delay encoding
+            qdel_index = exact.get("qdel_index", (c.T,)).astype(int)
+            qdel = ((np.arange(c.T) - qdel_index)[:, None]
+                    == np.arange(c.T)[None, :]) & (qdel_index >= 1)[:, None]
+        defined = ("incr_allowed" in exact.arrays)
         for n in range(c.N):
             print(f"Flow {n}")
             for t in range(c.T):
                 print("{:<3}".format(t), end=": ")
                 for dt in range(c.T):
-                    iname = f"incr_allowed_{n},{t},{dt}"
-                    dname = f"decr_allowed_{n},{t},{dt}"
-                    qname = f"qdel_{t},{dt}"
-                    if iname not in m:
-                        print(f" - /{int(m[qname])}", end=" ")
+                    if not defined or incr[n, t, dt] is None:
+                        print(f" - /{int(qdel[t, dt])}", end=" ")
                     else:
-                        print(
-                            f"{int(m[iname])}/{int(m[dname])}/{int(m[qname])}",
-                            end=" ")
+                        print(f"{int(incr[n, t, dt])}/{int(decr[n, t, dt])}/"
+                              f"{int(qdel[t, dt])}", end=" ")
                 print("")
 
-    acc_flows: List[Any] = [v.W, v.S, v.A, v.L]
+    acc_flows: List[Any] = [exact.W, exact.S, exact.A, exact.L]
     acc_flows_names: List[str] = ["W", "S", "A", "L"]
-    per_flow: List[Any] = [v.Ld_f, v.c_f, v.r_f]
+    per_flow: List[Any] = [exact.Ld_f, exact.c_f, exact.r_f]
     per_flow_names: List[str] = ["Ld_f", "c_f", "r_f"]
     if c.cca == "aimd":
-        per_flow.append("last_loss")
+        per_flow.append(exact.get("last_loss", (c.N, c.T)))
+        per_flow_names.append("last_loss")
     if c.cca == "bbr":
-        for n in range(c.N):
-            print("BBR start state = ", m[f"bbr_start_state_{n}"])
-            per_flow.extend(["max_rate"])
+        print("BBR start state = ", exact.get("bbr_start_state", (c.N,)))
+        per_flow.append(exact.get("max_rate", (c.N, c.T)))
+        per_flow_names.append("max_rate")
 
     # def printable(names) -> str:
     #     '''Create a human friendly name from the list after stripping
@@ -134,90 +126,60 @@ def plot_model(m: ModelDict, c: ModelConfig, v: VariableNames):
     # Print when we timed out
     for n in range(c.N):
         print(f"Flow {n} timed out at: ",
-              [t for t in range(c.T) if m[f"timeout_{n},{t}"]])
+              list(np.nonzero(tr.timeout_f[n])[0]))
 
     print("\n", "=" * 30, "\n")
     print(("t  " + "{:<15}" * len(col_names)).format(*col_names))
     for t, vals in enumerate(zip(*[c for c in cols])):
-        vals = ["%.10f" % float(v) for v in vals]
+        vals = ["%.10f" % float(v) if v is not None else "-" for v in vals]
         print(f"{t: <2}", ("{:<15}" * len(vals)).format(*vals))
 
     for n in range(c.N):
         args = {'marker': 'o', 'linestyle': linestyles[n]}
 
         if c.N > 1:
-            ax1.plot(times, to_arr("service", n) - adj,
+            ax1.plot(times, tr.S_f[n] - adj,
                      color='red', label='Egress %d' % n, **args)
-            ax1.plot(times, to_arr("arrival", n) - adj,
+            ax1.plot(times, tr.A_f[n] - adj,
                      color='blue', label='Ingress %d' % n, **args)
 
-        ax1.plot(times, to_arr("losts", n) - adj,
+        ax1.plot(times, tr.L_f[n] - adj,
                  color='orange', label='Num lost %d' % n, **args)
-        ax1.plot(times, to_arr("loss_detected", n)-adj,
+        ax1.plot(times, tr.Ld_f[n] - adj,
                  color='yellow', label='Num lost detected %d' % n, **args)
 
-        ax2.plot(times, to_arr("cwnd", n),
+        ax2.plot(times, tr.c_f[n],
                  color='black', label='Cwnd %d' % n, **args)
-        ax2_rate.plot(times, to_arr("rate", n),
+        ax2_rate.plot(times, tr.r_f[n],
                       color='orange', label='Rate %d' % n, **args)
 
     # Determine queuing delay
     if not c.simplify and c.calculate_qdel:
         # This doesn't work with simplification, since numerical errors creep
         # up
-        qdel_low = []
-        qdel_high = []
-        A = v.A
-        L = v.L
-        S = v.S
-        for t in range(c.T):
-            dt_found = None
-            if t > 0 and S[t] == S[t-1]:
-                assert(dt_found is None)
-                qdel_low.append(qdel_low[-1])
-                qdel_high.append(qdel_high[-1])
-                dt_found = qdel_low[-1]
-                continue
-            for dt in range(t):
-                if A[t-dt] - L[t-dt] == S[t] \
-                   and (t-dt == 0 or A[t-dt] - L[t-dt] != A[t-dt-1] - L[t-dt-1]):
-                    assert(dt_found is None)
-                    dt_found = dt
-                    qdel_low.append(dt)
-                    qdel_high.append(dt)
-                if A[t-dt-1] - L[t-dt-1] < S[t] and A[t-dt] - L[t-dt] > S[t]:
-                    assert(dt_found is None)
-                    dt_found = dt
-                    qdel_low.append(dt)
-                    qdel_high.append(dt+1)
-            if A[0] - L[0] > S[t]:
-                # Only lower bound is known
-                assert(dt_found is None)
-                qdel_low.append(t)
-                qdel_high.append(1e9)  # Infinity
-                dt_found = t
-            if A[0] - L[0] == S[t]:
-                assert(dt_found is None)
-                qdel_low.append(t)
-                qdel_high.append(t)
-                dt_found = t
-            assert(dt_found is not None)
-        max_qdel = max([x for x in qdel_high if x != 1e9])
+        qdel_low, qdel_high = exact.qdel_range()
+        max_qdel = max(qdel_high[np.isfinite(qdel_high)], default=0)
         ax2_rtt.set_ylim(min(qdel_low), max_qdel)
-        ax2_rtt.fill_between(times, qdel_high, qdel_low,
+        # Draw the unknown upper bound at the top of the plot
+        ax2_rtt.fill_between(times, np.minimum(qdel_high, max_qdel + 1),
+                             qdel_low,
                              color="skyblue", alpha=0.5, label="Q Delay")
 
     ax1.legend()
     ax2.legend(loc="upper left")
     ax2_rate.legend(loc="upper center")
     ax2_rtt.legend(loc="upper right")
-    plt.savefig('multi_flow_plot.svg')
-    plt.show()
+    if out_fname is not None:
+        plt.savefig(out_fname)
+    if show:
+        plt.show()
+    plt.close(fig)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python3 plot.py cache_file_name [simp]", file=sys.stderr)
+    if len(sys.argv) not in [2, 3]:
+        print("Usage: python3 plot.py cache_file_name [out_fname]",
+              file=sys.stderr)
         exit(1)
     try:
         f = open(sys.argv[1], 'rb')
@@ -229,6 +191,7 @@ if __name__ == "__main__":
     print(qres.satisfiable)
     if qres.satisfiable == "sat":
         assert(qres.model is not None)
-        plot_model(qres.model, qres.cfg)
+        plot_model(qres.model, qres.cfg, qres.v,
+                   out_fname=sys.argv[2] if len(sys.argv) == 3 else None)
     else:
         print("The query was unsatisfiable, so there is nothing to plot")
@@ -0,0 +1,133 @@
+''' Portfolio solving: race several Z3 configurations on the same query and
+take the first definitive answer. Hard queries are very sensitive to the
+random seed and tactics, so this turns worst-case latency into best-case
+latency (at the cost of cores) '''
+
+import multiprocessing as mp
+import queue
+import time
+from typing import Any, Dict, List, Optional
+import z3
+
+from config import ModelConfig
+from pyz3_utils import ModelDict, MySolver
+from utils import model_to_dict
+from variables import Variables, VariableValues
+
+
+class SolverConfig:
+    def __init__(self, name: str, params: Optional[Dict[str, Any]] = None,
+                 tactics: Optional[List[str]] = None):
+        # For printing
+        self.name = name
+        # Global Z3 parameters (passed to z3.set_param). Each configuration
+        # runs in its own process, so these don't interfere
+        self.params = {} if params is None else dict(params)
+        # If given, build the solver from these tactics (combined with `Then`)
+        # instead of using the default solver
+        self.tactics = tactics
+
+
+DEFAULT_PORTFOLIO = [
+    SolverConfig("default"),
+    SolverConfig("seed1", {"smt.random_seed": 1, "sat.random_seed": 1}),
+    SolverConfig("seed2", {"smt.random_seed": 2, "sat.random_seed": 2}),
+    SolverConfig("qflra", tactics=["qflra"]),
+    SolverConfig("preprocess",
+                 tactics=["simplify", "propagate-values", "solve-eqs", "smt"]),
+    SolverConfig("no-preprocess", {"smt.auto_config": False},
+                 tactics=["smt"]),
+]
+
+
+class PortfolioResult:
+    def __init__(self, satisfiable: str, model: Optional[ModelDict],
+                 cfg: ModelConfig, v: Optional[VariableValues],
+                 winner: Optional[str], time: float):
+        # Same fields as pyz3_utils.QueryResult, so the result can be plotted
+        # the same way
+        self.satisfiable = satisfiable
+        self.model = model
+        self.cfg = cfg
+        self.v = v
+        # Name of the SolverConfig that answered first (None if none did)
+        self.winner = winner
+        # Wall-clock time taken
+        self.time = time
+
+
+def solve_smt2(smt2: str, sc: SolverConfig, timeout: float,
+               res_queue: mp.Queue, idx: int):
+    ''' Solve the query given in SMT-LIB format under configuration `sc` and
+    put (idx, satisfiable, model) in `res_queue`. Runs in a worker process '''
+    try:
+        for k, val in sc.params.items():
+            z3.set_param(k, val)
+        if sc.tactics is None:
+            s = z3.Solver()
+        elif len(sc.tactics) == 1:
+            s = z3.Tactic(sc.tactics[0]).solver()
+        else:
+            s = z3.Then(*sc.tactics).solver()
+        s.set(timeout=int(timeout * 1000))
+        s.add(z3.parse_smt2_string(smt2))
+        satisfiable = str(s.check())
+        model = None
+        if satisfiable == "sat":
+            model = model_to_dict(s.model())
+        res_queue.put((idx, satisfiable, model))
+    except Exception as e:
+        # Report back so the portfolio doesn't wait on us till the timeout
+        print(f"Portfolio member {sc.name} failed: {e}")
+        res_queue.put((idx, "unknown", None))
+
+
+def run_portfolio_query(c: ModelConfig, s: MySolver, v: Variables,
+                        timeout: float = 10,
+                        portfolio: List[SolverConfig] = DEFAULT_PORTFOLIO)\
+        -> PortfolioResult:
+    '''Like `run_query`, but runs the assertions in `s` under every
+    configuration in `portfolio` in parallel. Returns as soon as any of them
+    gives 'sat' or 'unsat', and kills the rest. If all time out or give up,
+    the result is 'unknown'. Results are not cached
+
+    '''
+    start = time.time()
+    smt2 = s.to_smt2()
+    res_queue: mp.Queue = mp.Queue()
+    procs = [mp.Process(target=solve_smt2,
+                        args=(smt2, sc, timeout, res_queue, i))
+             for (i, sc) in enumerate(portfolio)]
+    for p in procs:
+        p.start()
+
+    satisfiable, model, winner = "unknown", None, None
+    try:
+        for _ in range(len(procs)):
+            # Give the workers a little slack beyond the solver timeout to
+            # report back
+            remaining = timeout + 5 - (time.time() - start)
+            if remaining <= 0:
+                break
+            try:
+                idx, sat, m = res_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if sat in ["sat", "unsat"]:
+                satisfiable, model = sat, m
+                winner = portfolio[idx].name
+                break
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        for p in procs:
+            p.join()
+
+    print(f"Portfolio: {satisfiable} from {winner} in "
+          f"{time.time() - start:.1f}s")
+    values = None
+    if model is not None:
+        values = VariableValues(v, model)
+    return PortfolioResult(satisfiable, model, c, values, winner,
+                           time.time() - start)
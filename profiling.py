@@ -0,0 +1,129 @@
+''' Where the time goes in a query: encoding time, assertion counts and
+variable counts per constraint family (as encoded by `make_solver`), plus
+solve time and Z3's own statistics. `make_solver` records the encoding part
+in `s.profile`; `record_solve` fills in the rest after the query is run.
+
+MySolver only wraps what the model needs to build a query, so assertions and
+statistics are read from the z3 solver it wraps (`s.s`) '''
+
+from contextlib import contextmanager
+import time
+from typing import Any, Dict, Iterator, Optional, Set
+import z3
+
+from pyz3_utils import MySolver
+
+
+class FamilyStats:
+    def __init__(self, time: float = 0, assertions: int = 0,
+                 variables: Optional[int] = None):
+        # Seconds spent building the constraints
+        self.time = time
+        # Number of top-level assertions added
+        self.assertions = assertions
+        # Number of variables first used by this family. Counting requires a
+        # walk over the assertions, so it is only done on request (see
+        # `QueryProfile.count_variables`)
+        self.variables = variables
+        # Indices [start, end) of this family's assertions in the solver. Not
+        # persisted
+        self.range: Optional[Any] = None
+
+
+class QueryProfile:
+    def __init__(self):
+        # Constraint family -> stats, in the order they were first encoded. A
+        # family that is encoded more than once (e.g. when the horizon is
+        # extended) accumulates
+        self.families: Dict[str, FamilyStats] = {}
+        self.solve_time: Optional[float] = None
+        # Z3's statistics from the last check (conflicts, decisions, memory,
+        # ...)
+        self.z3_stats: Dict[str, float] = {}
+
+    @contextmanager
+    def family(self, name: str, s: MySolver) -> Iterator[None]:
+        ''' Attribute the assertions added in this block to `name` '''
+        before = len(s.s.assertions())
+        start = time.time()
+        yield
+        elapsed = time.time() - start
+        after = len(s.s.assertions())
+        stats = self.families.setdefault(name, FamilyStats())
+        stats.time += elapsed
+        stats.assertions += after - before
+        stats.range = (before, after) if stats.range is None \
+            else (stats.range[0], after)
+
+    def count_variables(self, s: MySolver):
+        ''' Fill in the number of variables each family introduced, by
+        walking the assertions in the order they were added '''
+        assertions = s.s.assertions()
+        seen: Set[int] = set()
+        variables: Set[str] = set()
+        for stats in self.families.values():
+            if stats.range is None:
+                continue
+            before = len(variables)
+            stack = [assertions[i] for i in range(*stats.range)]
+            while len(stack) > 0:
+                e = stack.pop()
+                if e.get_id() in seen:
+                    continue
+                seen.add(e.get_id())
+                if z3.is_const(e) \
+                   and e.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+                    variables.add(e.decl().name())
+                elif z3.is_app(e):
+                    stack.extend(e.children())
+            stats.variables = len(variables) - before
+
+    def record_solve(self, s: MySolver, solve_time: float):
+        ''' Call right after the solver's check '''
+        self.solve_time = solve_time
+        stats = s.s.statistics()
+        self.z3_stats = {k: stats.get_key_value(k) for k in stats.keys()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "families": {name: {"time": x.time, "assertions": x.assertions,
+                                "variables": x.variables}
+                         for (name, x) in self.families.items()},
+            "solve_time": self.solve_time,
+            "z3_stats": self.z3_stats,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "QueryProfile":
+        res = cls()
+        res.families = {name: FamilyStats(**x)
+                        for (name, x) in d["families"].items()}
+        res.solve_time = d["solve_time"]
+        res.z3_stats = d["z3_stats"]
+        return res
+
+    def table(self) -> str:
+        lines = ["{:<20} {:>9} {:>11} {:>10}".format(
+            "family", "time", "assertions", "variables")]
+        for (name, x) in self.families.items():
+            lines.append("{:<20} {:>8.3f}s {:>11} {:>10}".format(
+                name, x.time, x.assertions,
+                "-" if x.variables is None else x.variables))
+        total = sum([x.time for x in self.families.values()])
+        lines.append("{:<20} {:>8.3f}s {:>11}".format(
+            "total", total,
+            sum([x.assertions for x in self.families.values()])))
+        if self.solve_time is not None:
+            lines.append(f"\nsolve time: {self.solve_time:.3f}s")
+        for k in ["conflicts", "decisions", "propagations", "memory",
+                  "max memory", "time"]:
+            if k in self.z3_stats:
+                lines.append(f"{k + ':':<14} {self.z3_stats[k]}")
+        return "\n".join(lines)
+
+
+def profile_of(s: MySolver) -> QueryProfile:
+    ''' The profile attached to `s`, creating it if there is none '''
+    if not hasattr(s, "profile"):
+        s.profile = QueryProfile()
+    return s.profile
@@ -2,6 +2,7 @@ from z3 import And, Not, Or
 
 from config import ModelConfig
 from model import make_solver
+from model_trace import Trace
 from plot import plot_model
 from pyz3_utils import MySolver, run_query
 from utils import make_periodic
@@ -53,21 +54,11 @@ def print_rules(model):
     for rulenum in rules.keys():
         print(rules[rulenum])
 
-def print_signal_state(model, flows, time):
-    signal_state = {"rewma": [np.zeros(time) * flows], "sewma": [np.zeros(time) * flows], "srewma": [np.zeros(time) * flows], "rttr": [np.zeros(time) * flows], "rcv": [np.zeros(time) * flows], "snd": [np.zeros(time) * flows]}
-    keys = list(model.keys())
-    keys.sort()
-    for var in keys:
-        if (var.startswith("ma_rewma") or var.startswith("ma_sewma") or var.startswith("ma_srewma") or var.startswith("ma_rttr") or var.startswith("ma_pkt")) \
-            and not(">" in var) and not("<" in var) and not("=" in var):
-            tokens = var.split("_")
-            vals = tokens[-1].split(",")
-            flow = int(vals[0])
-            time = int(vals[1])
-            if var.startswith("ma_pkt"):
-                signal_state[tokens[2]][flow][time] = model[var].numerator / model[var].denominator
-            else:
-                signal_state[tokens[1]][flow][time] = model[var].numerator / model[var].denominator
+def print_signal_state(model, c):
+    tr = Trace(c, model)
+    flows, time = c.N, c.T
+    signal_state = {"rewma": tr.get("ma_rewma", (flows, time)), "sewma": tr.get("ma_sewma", (flows, time)), "srewma": tr.get("ma_srewma", (flows, time)),
+                    "rttr": tr.get("ma_rttr", (flows, time)), "rcv": tr.get("ma_pkt_rcv", (flows, time)), "snd": tr.get("ma_pkt_snd", (flows, time))}
 
     header_format = "{:5s} " + "{:10s} {:10s} {:10s} {:10s} {:8s} {:8s}" * flows
     print(header_format.format("time", *["f" + str(i) + "_" + k for k in signal_state.keys() for i in range(flows)]))
@@ -112,7 +103,7 @@ def cca_ma_test(timeout=10):
     print("Satisfiability:", qres.satisfiable)
     if str(qres.satisfiable) == "sat":
         print_rules(qres.model)
-        print_signal_state(qres.model, c.N, c.T)
+        print_signal_state(qres.model, c)
         plot_model(qres.model, c, qres.v)
 
 
@@ -0,0 +1,247 @@
+''' A persistent, indexed store of query results. Results are keyed by a hash
+of the assertions and the ModelConfig, so re-running a query
+whose encoding hasn't changed is free, and results can be looked up by
+configuration. Stored in SQLite with the models as pickled blobs '''
+
+import hashlib
+import json
+import pickle as pkl
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+import z3
+
+from config import ModelConfig
+from profiling import QueryProfile, profile_of
+from pyz3_utils import ModelDict, MySolver, run_query
+from variables import Variables, VariableValues
+
+
+def config_json(c: ModelConfig) -> str:
+    ''' Canonical serialization of the config. Values that aren't plain
+    numbers/strings (e.g. a symbolic alpha) are converted to strings '''
+    d = {k: (x if type(x) in [int, float, str, bool, type(None)] else str(x))
+         for (k, x) in c.to_dict().items()}
+    return json.dumps(d, sort_keys=True)
+
+
+def assertions_hash(s: MySolver) -> str:
+    '''Structural hash of the assertions. We can't just hash `s.to_smt2()`,
+    since which subterms Z3 let-binds (and what it names them) depends on
+    what else the process has built. Shared subterms are hashed once
+
+    '''
+    memo: Dict[int, str] = {}
+
+    def node_hash(root: z3.ExprRef) -> str:
+        # An explicit stack, since deep terms would overflow Python's
+        # recursion limit
+        stack = [root]
+        while len(stack) > 0:
+            a = stack[-1]
+            if a.get_id() in memo:
+                stack.pop()
+                continue
+            children = a.children()
+            missing = [x for x in children if x.get_id() not in memo]
+            if len(missing) > 0:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            if a.num_args() == 0:
+                # Variable or constant
+                desc = f"{a.sort()} {a}"
+            else:
+                desc = a.decl().name() + " " + " ".join(
+                    [memo[x.get_id()] for x in children])
+            memo[a.get_id()] = hashlib.sha256(desc.encode()).hexdigest()
+        return memo[root.get_id()]
+
+    h = hashlib.sha256()
+    # Read from the wrapped z3 solver, since MySolver only wraps what the
+    # model needs to build a query
+    for a in s.s.assertions():
+        h.update(node_hash(a).encode())
+    return h.hexdigest()
+
+
+def query_key(c: ModelConfig, s: MySolver) -> str:
+    ''' Content hash of the query: the assertions and the config '''
+    h = hashlib.sha256()
+    h.update(assertions_hash(s).encode())
+    h.update(config_json(c).encode())
+    return h.hexdigest()
+
+
+class CachedResult:
+    def __init__(self, key: str, satisfiable: str, model: Optional[ModelDict],
+                 cfg: ModelConfig, v: Optional[VariableValues],
+                 solve_time: float, timeout: float, z3_version: str,
+                 from_cache: bool, profile: Optional[QueryProfile] = None):
+        # Same fields as pyz3_utils.QueryResult, so the result can be plotted
+        # the same way
+        self.satisfiable = satisfiable
+        self.model = model
+        self.cfg = cfg
+        self.v = v
+        self.key = key
+        # Wall-clock time the solver took when the result was computed
+        self.solve_time = solve_time
+        # The timeout the query was run with. Matters for 'unknown' results
+        self.timeout = timeout
+        self.z3_version = z3_version
+        # Whether the result was found in the cache rather than computed
+        self.from_cache = from_cache
+        # Where the time went when the result was computed (see
+        # profiling.py). None for results stored before profiles were kept
+        self.profile = profile
+
+
+class QueryCache:
+    def __init__(self, fname: str = "cached/results.db"):
+        self.fname = fname
+        # Generous timeout, since sweeps write from many processes at once
+        self.db = sqlite3.connect(fname, timeout=60)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            config_hash TEXT NOT NULL,
+            config TEXT NOT NULL,
+            satisfiable TEXT NOT NULL,
+            solve_time REAL NOT NULL,
+            timeout REAL NOT NULL,
+            z3_version TEXT NOT NULL,
+            created REAL NOT NULL,
+            model BLOB,
+            profile TEXT)''')
+        # Stores created before profiles were recorded lack the column
+        columns = [x[1] for x in
+                   self.db.execute("PRAGMA table_info(results)").fetchall()]
+        if "profile" not in columns:
+            self.db.execute("ALTER TABLE results ADD COLUMN profile TEXT")
+        self.db.execute('''CREATE INDEX IF NOT EXISTS results_config
+            ON results (config_hash)''')
+        self.db.commit()
+
+    def get(self, key: str, timeout: float = 0) -> Optional[Dict[str, Any]]:
+        '''Return the stored row for `key`, if any. An 'unknown' result only
+        counts if it was computed with at least `timeout` seconds, since
+        otherwise a longer run might succeed
+
+        '''
+        row = self.db.execute(
+            '''SELECT key, config, satisfiable, solve_time, timeout,
+            z3_version, created, model, profile FROM results
+            WHERE key = ?''',
+            (key,)).fetchone()
+        if row is None:
+            return None
+        res = self.row_to_dict(row)
+        if res["satisfiable"] not in ["sat", "unsat"] \
+           and res["timeout"] < timeout:
+            return None
+        return res
+
+    def put(self, key: str, c: ModelConfig, satisfiable: str,
+            model: Optional[ModelDict], solve_time: float, timeout: float,
+            profile: Optional[QueryProfile] = None):
+        cfg = config_json(c)
+        self.db.execute(
+            '''INSERT OR REPLACE INTO results (key, config_hash, config,
+            satisfiable, solve_time, timeout, z3_version, created, model,
+            profile) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (key, hashlib.sha256(cfg.encode()).hexdigest(), cfg,
+             satisfiable, solve_time, timeout, z3.get_version_string(),
+             time.time(), None if model is None else pkl.dumps(model),
+             None if profile is None else json.dumps(profile.to_dict())))
+        self.db.commit()
+
+    def results_for(self, c: ModelConfig) -> List[Dict[str, Any]]:
+        ''' All stored results for queries made with exactly this config '''
+        cfg_hash = hashlib.sha256(config_json(c).encode()).hexdigest()
+        rows = self.db.execute(
+            '''SELECT key, config, satisfiable, solve_time, timeout,
+            z3_version, created, model, profile FROM results
+            WHERE config_hash = ? ORDER BY created''',
+            (cfg_hash,)).fetchall()
+        return [self.row_to_dict(row) for row in rows]
+
+    def all(self) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            '''SELECT key, config, satisfiable, solve_time, timeout,
+            z3_version, created, model, profile FROM results
+            ORDER BY created''')\
+            .fetchall()
+        return [self.row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def row_to_dict(row) -> Dict[str, Any]:
+        key, cfg, satisfiable, solve_time, timeout, version, created, \
+            model, profile = row
+        return {
+            "key": key,
+            "config": json.loads(cfg),
+            "satisfiable": satisfiable,
+            "solve_time": solve_time,
+            "timeout": timeout,
+            "z3_version": version,
+            "created": created,
+            "model": None if model is None else pkl.loads(model),
+            "profile": None if profile is None
+            else QueryProfile.from_dict(json.loads(profile)),
+        }
+
+    def run_query(self, c: ModelConfig, s: MySolver, v: Variables,
+                  timeout: float = 10) -> CachedResult:
+        ''' Like `run_query`, but first looks the query up in the store and
+        records the result if it had to be computed '''
+        key = query_key(c, s)
+        row = self.get(key, timeout)
+        from_cache = row is not None
+        if row is None:
+            start = time.time()
+            qres = run_query(c, s, v, timeout)
+            solve_time = time.time() - start
+            profile = profile_of(s)
+            profile.record_solve(s, solve_time)
+            profile.count_variables(s)
+            self.put(key, c, str(qres.satisfiable), qres.model, solve_time,
+                     timeout, profile)
+            row = self.get(key)
+            assert row is not None
+        else:
+            print(f"Found cached result for {key[:16]}")
+
+        values = None
+        if row["model"] is not None:
+            values = VariableValues(v, row["model"])
+        return CachedResult(key, row["satisfiable"], row["model"], c, values,
+                            row["solve_time"], row["timeout"],
+                            row["z3_version"], from_cache, row["profile"])
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 3:
+        print("Usage: python3 query_cache.py [db_file [key_prefix]]",
+              file=sys.stderr)
+        exit(1)
+    cache = QueryCache(*sys.argv[1:2])
+    if len(sys.argv) == 3:
+        # Show the profile of the matching results
+        for r in cache.all():
+            if not r["key"].startswith(sys.argv[2]):
+                continue
+            print(f"{r['key'][:16]}: {r['satisfiable']}")
+            if r["profile"] is None:
+                print("No profile recorded\n")
+            else:
+                print(r["profile"].table() + "\n")
+        exit(0)
+    print(("{:<18}" + "{:<10}" * 6).format(
+        "key", "result", "time", "cca", "T", "N", "buf_min"))
+    for r in cache.all():
+        cfg = r["config"]
+        print(("{:<18}" + "{:<10}" * 6).format(
+            r["key"][:16], r["satisfiable"], "%.2f" % r["solve_time"],
+            cfg["cca"], cfg["T"], cfg["N"], str(cfg["buf_min"])))
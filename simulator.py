@@ -0,0 +1,428 @@
+''' A concrete, discrete-time simulator for the model. Given the adversary's
+choices (how much the link serves at each timestep) and values for the
+parameters the solver would otherwise pick (alpha, the initial cwnd, ...), it
+runs the network model and the CCA's update rules forward in time. Many
+scenarios are simulated at once as a batch of NumPy arrays, so random or
+heuristic schedules can be screened quickly, and only the promising ones sent
+to the solver.
+
+The simulator makes the choices that the model leaves open in a fixed way:
+the link wastes only when it has nothing to serve, packets are dropped only
+when the queue exceeds `buf`, flows are served in FIFO order and loss is
+detected as early as the dupack rule allows. Some schedules lead to traces
+the model rules out (e.g. Copa must see the service move at every
+timestep). These are flagged in `SimResult.feasible`. `check_model` confirms
+a simulated trace against the SMT encoding '''
+
+from fractions import Fraction
+import numpy as np
+from typing import Optional, Union
+from z3 import And, Q
+
+from config import ModelConfig
+from model import make_solver
+from pyz3_utils import ModelDict
+
+# A scalar or one value per scenario in the batch
+Param = Union[float, np.ndarray]
+
+
+class SimResult:
+    def __init__(self, c: ModelConfig, B: int):
+        self.c = c
+        N, T = c.N, c.T
+        # Number of scenarios in the batch
+        self.B = B
+        # Same names as in `Variables`. Per-flow series have shape (B, N, T)
+        # and totals (B, T)
+        self.A_f = np.zeros((B, N, T))
+        self.S_f = np.zeros((B, N, T))
+        self.L_f = np.zeros((B, N, T))
+        self.Ld_f = np.zeros((B, N, T))
+        self.c_f = np.zeros((B, N, T))
+        self.r_f = np.zeros((B, N, T))
+        self.timeout_f = np.zeros((B, N, T), dtype=bool)
+        self.A = np.zeros((B, T))
+        self.S = np.zeros((B, T))
+        self.L = np.zeros((B, T))
+        self.W = np.zeros((B, T))
+        # Shape (B,)
+        self.alpha = np.zeros(B)
+        self.dupacks = np.zeros(B)
+        self.epsilon = np.zeros(B)
+        # The time at which the bytes exiting at t were input, as in the
+        # "index" qdel encoding. Shape (B, T)
+        self.qdel_index = np.zeros((B, T), dtype=int)
+        # BBR's max rate, for plotting. Shape (B, N, T). NaN where undefined
+        self.max_rate = np.full((B, N, T), np.nan)
+        # Whether the model allows this trace. Shape (B,)
+        self.feasible = np.ones(B, dtype=bool)
+
+    def model(self, b: int) -> ModelDict:
+        ''' Scenario `b` as a ModelDict with the same names as a solved model,
+        so it can be used with `Trace`, `plot_model` etc. '''
+        c = self.c
+        m: ModelDict = {"alpha": float(self.alpha[b]),
+                        "dupacks": float(self.dupacks[b])}
+        if not c.compose:
+            m["epsilon"] = float(self.epsilon[b])
+        per_flow = [("arrival", self.A_f), ("service", self.S_f),
+                    ("losts", self.L_f), ("loss_detected", self.Ld_f),
+                    ("cwnd", self.c_f), ("rate", self.r_f)]
+        totals = [("tot_arrival", self.A), ("tot_service", self.S),
+                  ("tot_lost", self.L), ("wasted", self.W)]
+        for n in range(c.N):
+            for t in range(c.T):
+                for (name, x) in per_flow:
+                    m[f"{name}_{n},{t}"] = float(x[b, n, t])
+                m[f"timeout_{n},{t}"] = bool(self.timeout_f[b, n, t])
+                if not np.isnan(self.max_rate[b, n, t]):
+                    m[f"max_rate_{n},{t}"] = float(self.max_rate[b, n, t])
+        for t in range(c.T):
+            for (name, x) in totals:
+                m[f"{name}_{t}"] = float(x[b, t])
+        return m
+
+
+def check_model(c: ModelConfig, m: ModelDict, tol: float = 0) -> bool:
+    '''Whether the SMT encoding of the model admits the trace `m` (e.g. from
+    `SimResult.model`). Every value is allowed to differ by up to `tol`, to
+    absorb floating point error; with tol = 0 they must match exactly'''
+    s, v, _ = make_solver(c)
+    names = {str(x): x for x in [v.alpha, v.dupacks]
+             + ([v.epsilon] if not c.compose else [])
+             + [x for xs in v.A_f + v.S_f + v.L_f + v.Ld_f + v.c_f + v.r_f
+                + [v.A, v.S, v.L, v.W] for x in xs]}
+    for n in range(c.N):
+        for t in range(c.T):
+            s.add(v.timeout_f[n][t] == m[f"timeout_{n},{t}"])
+    for (name, x) in names.items():
+        if type(x) in [int, float] or name not in m:
+            # A constant set in the config
+            continue
+        # Convert exactly, rather than through the float's decimal form
+        val = Fraction(m[name])
+        val = Q(val.numerator, val.denominator)
+        if tol == 0:
+            s.add(x == val)
+        else:
+            s.add(And(x >= val - tol, x <= val + tol))
+    return str(s.check()) == "sat"
+
+
+def fifo_split(inp_f: np.ndarray, S: np.ndarray) -> np.ndarray:
+    '''Per-flow service when the total service is S and bytes are served in
+    the order they were input. `inp_f` (B, N, t+1) is the cumulative input
+    (A_f - L_f) of each flow up to now and S (B,) the total service. Input
+    that arrived in the same timestep is served in proportion to each flow's
+    share of it'''
+    if inp_f.shape[1] == 1:
+        return S[:, None]
+    inp = inp_f.sum(axis=1)
+    # The first timestep at which cumulative input reached S
+    k = np.minimum((inp < S[:, None]).sum(axis=1), inp.shape[1] - 1)
+    rows = np.arange(len(S))
+    prev_f = np.where(k[:, None] > 0, inp_f[rows, :, np.maximum(k - 1, 0)],
+                      0)
+    new_f = inp_f[rows, :, k] - prev_f
+    prev, new = prev_f.sum(axis=1), new_f.sum(axis=1)
+    frac = np.where(new > 0, (S - prev) / np.where(new > 0, new, 1), 0)
+    return prev_f + frac[:, None] * new_f
+
+
+def simulate(c: ModelConfig, service: np.ndarray, alpha: Param = 0.1,
+             cwnd0: Optional[Param] = None, rate0: Optional[Param] = None,
+             arrival0: Param = 0, buf: Optional[Param] = None,
+             dupacks: Optional[Param] = None, start_state: Param = 0)\
+        -> SimResult:
+    '''Simulate `service.shape[0]` scenarios. `service` (B, T) is the
+    adversary's schedule, in [0, 1]: where the total service at each
+    timestep falls between the least and the most the link may serve. The
+    rest are the free parameters:
+
+    * alpha, dupacks: as in `Variables` (ignored if set in the config).
+      dupacks defaults to 3 * alpha
+    * cwnd0, rate0: cwnd and rate of each flow before the CCA has enough
+      history to set them. Default to 1 BDP and C
+    * arrival0: bytes each flow has sent at t = 0
+    * buf: the queue size above which packets are dropped. Must be in
+      [buf_min, buf_max]. Defaults to buf_max, or buf_min if that is None
+    * start_state: BBR's state at t = 0
+
+    Supports the const, aimd, copa and bbr CCAs
+
+    '''
+    assert c.cca in ["const", "aimd", "copa", "bbr"], \
+        f"Cannot simulate cca '{c.cca}'"
+    if service.ndim == 1:
+        service = service[None, :]
+    B, N, T, R, D, C = service.shape[0], c.N, c.T, c.R, c.D, c.C
+    assert service.shape[1] == T
+    res = SimResult(c, B)
+
+    def param(x: Param) -> np.ndarray:
+        return np.broadcast_to(np.asarray(x, dtype=float), (B,)).copy()
+
+    alpha_ = param(alpha if c.alpha is None else c.alpha)
+    if c.cca == "aimd":
+        dupacks_ = 3 * alpha_
+    elif c.dupacks is not None:
+        dupacks_ = param(c.dupacks)
+    else:
+        dupacks_ = 3 * alpha_ if dupacks is None else param(dupacks)
+    cwnd0_ = param(C * R if cwnd0 is None else cwnd0)
+    rate0_ = param(C if rate0 is None else rate0)
+    if buf is None:
+        buf = c.buf_max if c.buf_max is not None else c.buf_min
+    buf_ = None if buf is None else param(buf)
+    eps = 2 * alpha_ if c.epsilon == "gt_alpha" else np.zeros(B)
+    res.alpha, res.dupacks, res.epsilon = alpha_, dupacks_, eps
+
+    # CCA state
+    ll = np.zeros((B, N))
+    incr = np.full((B, N), c.aimd_incr_irrespective)
+    since = np.zeros((B, N))
+    state = param(start_state)
+
+    for t in range(T):
+        # Loss detection, from what was acked by t - R
+        if t < R:
+            res.Ld_f[:, :, t] = 0
+        else:
+            last = t - R
+            inp_f = res.A_f[:, :, :last+1] - res.L_f[:, :, :last+1]
+            detectable = inp_f + dupacks_[:, None, None] \
+                <= res.S_f[:, :, last, None]
+            # Detectable timesteps form a prefix, since A - L is monotone
+            frontier = detectable.sum(axis=2) - 1
+            lost = np.take_along_axis(
+                res.L_f[:, :, :last+1], np.maximum(frontier, 0)[:, :, None],
+                axis=2)[:, :, 0]
+            Ld = np.maximum(res.Ld_f[:, :, t-1],
+                            np.where(frontier >= 0, lost, 0))
+            upper = np.take_along_axis(
+                res.L_f[:, :, :last+1],
+                np.minimum(frontier + 1, last)[:, :, None], axis=2)[:, :, 0]
+            res.feasible &= np.all(Ld <= upper, axis=1)
+            res.Ld_f[:, :, t] = Ld
+            res.timeout_f[:, :, t] = \
+                (res.S_f[:, :, last] < res.A_f[:, :, t-1]) \
+                & (res.S_f[:, :, last]
+                   == res.A_f[:, :, last] - res.L_f[:, :, last])
+        timeout = res.timeout_f[:, :, t]
+
+        # The CCA picks cwnd and rate
+        cwnd, rate = cca_step(c, res, t, alpha_, cwnd0_, rate0_, ll, incr,
+                              state, timeout)
+        res.c_f[:, :, t] = cwnd
+        res.r_f[:, :, t] = rate
+
+        # Network. On timeout, Ld is L at this timestep, which depends on what
+        # is sent now, so we iterate to a fixed point
+        prev_L_f = res.L_f[:, :, t-1] if t > 0 else np.zeros((B, N))
+        for _ in range(3):
+            if t == 0:
+                A_f = np.broadcast_to(param(arrival0)[:, None], (B, N))
+            elif t < R:
+                # Anything can happen here. Send nothing
+                A_f = res.A_f[:, :, t-1]
+            else:
+                A_w = np.maximum(
+                    res.S_f[:, :, t-R] + res.Ld_f[:, :, t] + cwnd,
+                    res.A_f[:, :, t-1])
+                A_r = res.A_f[:, :, t-1] + rate
+                A_f = np.minimum(A_w, A_r)
+            A = A_f.sum(axis=1)
+            L_prev = prev_L_f.sum(axis=1)
+            # The link wastes only what it can't serve
+            W = C * t - (A - L_prev)
+            if t > 0:
+                W = np.maximum(res.W[:, t-1], W)
+            if c.buf_min is not None:
+                L = np.maximum(L_prev, A - (C * t - W + buf_))
+            else:
+                L = L_prev
+            # Drop from what each flow sent in this timestep
+            if N == 1:
+                L_f = L[:, None]
+            else:
+                new_f = A_f - (res.A_f[:, :, t-1] if t > 0 else 0)
+                new = new_f.sum(axis=1)
+                L_f = prev_L_f + np.where(
+                    new > 0, (L - L_prev) / np.where(new > 0, new, 1),
+                    0)[:, None] * new_f
+            if np.all(~timeout | (res.Ld_f[:, :, t] == L_f)):
+                break
+            res.Ld_f[:, :, t] = np.where(timeout, L_f, res.Ld_f[:, :, t])
+        res.feasible &= np.all(~timeout | (res.Ld_f[:, :, t] == L_f), axis=1)
+        if t >= R:
+            res.feasible &= np.all(res.Ld_f[:, :, t] <= res.L_f[:, :, t-R],
+                                   axis=1)
+        res.A_f[:, :, t], res.L_f[:, :, t] = A_f, L_f
+        res.A[:, t], res.L[:, t], res.W[:, t] = A, L, W
+        if c.buf_max is not None:
+            res.feasible &= A - L <= C * t - W + c.buf_max
+
+        # Service
+        hi = np.minimum(C * t - W, A - L)
+        lo = C * (t - D) - res.W[:, max(t - D, 0)]
+        if t == 0:
+            S = np.zeros(B)
+        else:
+            lo = np.maximum(lo, res.S[:, t-1])
+            if not c.compose:
+                # Waste requires the queue to be (almost) empty
+                lo = np.where(W > res.W[:, t-1], np.maximum(lo, A - L - eps),
+                              lo)
+            S = lo + service[:, t] * (hi - lo)
+        res.feasible &= (lo <= S) & (S <= hi)
+        res.S[:, t] = S
+        res.S_f[:, :, t] = fifo_split(
+            res.A_f[:, :, :t+1] - res.L_f[:, :, :t+1], S)
+
+        # The time the bytes exiting now were input
+        inp = res.A[:, :t+1] - res.L[:, :t+1]
+        fresh = np.minimum((inp < S[:, None]).sum(axis=1), t)
+        if t == 0:
+            res.qdel_index[:, t] = fresh
+        else:
+            # Otherwise the delay carries forward (see calculate_qdel_index)
+            prev = res.qdel_index[:, t-1]
+            res.qdel_index[:, t] = np.where(
+                S != res.S[:, t-1], fresh, np.where(prev == 0, 0, prev + 1))
+
+        if N > 1:
+            # See `multi_flows` in model.py
+            k = res.qdel_index[:, t]
+            arrived = np.take_along_axis(
+                res.A_f[:, :, :t+1], np.maximum(k - 1, 0)[:, None, None],
+                axis=2)[:, :, 0]
+            res.feasible &= (k < 1) | np.all(res.S_f[:, :, t] > arrived,
+                                             axis=1)
+
+        # CCA state that depends on what happened in this timestep
+        if c.cca == "aimd":
+            if t == 0:
+                ll[:] = res.S_f[:, :, 0]
+                since[:] = res.S_f[:, :, 0]
+            else:
+                reset = timeout | aimd_decrease(c, res, t, ll)
+                ll[:] = np.where(
+                    reset, A_f - L_f + dupacks_[:, None], ll)
+                if not c.aimd_incr_irrespective:
+                    same = res.c_f[:, :, t-1] == cwnd
+                    incr[:] = (same & (res.S_f[:, :, t] - since >= cwnd)) \
+                        | (res.S_f[:, :, t] - res.S_f[:, :, t-1] >= cwnd)
+                    since[:] = np.where(same, since, res.S_f[:, :, t])
+    return res
+
+
+def aimd_decrease(c: ModelConfig, res: SimResult, t: int, ll: np.ndarray)\
+        -> np.ndarray:
+    ''' Whether AIMD reacts to newly detected loss at t (see `cca_aimd`) '''
+    decrease = res.Ld_f[:, :, t] > res.Ld_f[:, :, t-1]
+    if t > c.R + 1:
+        decrease &= ll <= res.S_f[:, :, t-c.R-1]
+    return decrease
+
+
+def copa_delay(res: SimResult, t: int) -> np.ndarray:
+    return t - res.qdel_index[:, t]
+
+
+def cca_step(c: ModelConfig, res: SimResult, t: int, alpha: np.ndarray,
+             cwnd0: np.ndarray, rate0: np.ndarray, ll: np.ndarray,
+             incr: np.ndarray, state: np.ndarray, timeout: np.ndarray):
+    ''' The cwnd and rate, each (B, N), the CCA picks at t '''
+    B, N, R = res.B, c.N, c.R
+    a = alpha[:, None]
+    cwnd0 = np.broadcast_to(cwnd0[:, None], (B, N))
+
+    if c.cca == "const":
+        cwnd = np.broadcast_to(a, (B, N))
+        rate = cwnd / R if c.pacing else np.full((B, N), c.C * 100)
+        return (cwnd, rate)
+
+    if c.cca == "aimd":
+        if t == 0:
+            cwnd = cwnd0
+        else:
+            prev = res.c_f[:, :, t-1]
+            cwnd = np.where(incr, prev + a, prev)
+            cwnd = np.where(aimd_decrease(c, res, t, ll), prev / 2, cwnd)
+            cwnd = np.where(timeout, a, cwnd)
+        rate = cwnd / R if c.pacing else np.full((B, N), c.C * 100)
+        return (cwnd, rate)
+
+    if c.cca == "copa":
+        if t - R - c.D < 0:
+            cwnd = cwnd0
+        else:
+            # See `allowed_linear` in cca_copa
+            prev = res.c_f[:, :, t-1]
+            moved = (res.S[:, t-R] > res.S[:, t-R-1])[:, None]
+            incr_allowed = np.zeros((B, N), dtype=bool)
+            decr_allowed = np.zeros((B, N), dtype=bool)
+            for d in range(c.D):
+                # Index 0 means the delay is unknown
+                known = (res.qdel_index[:, t-R-d] >= 1)[:, None]
+                k = np.maximum(0, copa_delay(res, t-R-d) - 1)[:, None]
+                incr_allowed |= known & (prev * k <= a * (R + k))
+                known = (res.qdel_index[:, t-R-d-1] >= 1)[:, None]
+                k = copa_delay(res, t-R-d-1)[:, None]
+                decr_allowed |= known & (prev * k >= a * (R + k))
+            incr_allowed &= moved
+            decr_allowed = (decr_allowed & moved) \
+                | (res.S[:, t-R] < res.A[:, 0] - res.L[:, 0])[:, None]
+            res.feasible &= np.all(incr_allowed | decr_allowed, axis=1)
+            sub = prev - a / R
+            cwnd = np.where(incr_allowed, prev + a / R,
+                            np.where(sub < a, a, sub))
+        return (cwnd, cwnd / R)
+
+    assert c.cca == "bbr"
+    P = R
+    first = R + P
+    if t < first:
+        return (cwnd0, np.broadcast_to(rate0[:, None], (B, N)))
+    rates = [(res.S_f[:, :, u-R] - res.S_f[:, :, u-R-P]) / P
+             for u in range(max(first, t - c.bbr_max_R + 1), t + 1)]
+    max_rate = np.max(rates, axis=0)
+    res.max_rate[:, :, t] = max_rate
+    s_0 = (state == (0 - t / R) % c.bbr_cycle)[:, None]
+    s_1 = (state == (1 - t / R) % c.bbr_cycle)[:, None]
+    gain = np.where(s_0, 1.25, np.where(s_1, 0.8, 1))
+    return (2 * max_rate * P, gain * max_rate)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        parents=[ModelConfig.get_argparse()],
+        description="Screen random schedules for the lowest utilization")
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--alpha-sim", type=float, default=0.1,
+                        help="alpha to simulate with if not set in config")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--plot", action="store_true")
+    args = parser.parse_args()
+
+    c = ModelConfig.from_argparse(args)
+    c.calculate_qdel = c.calculate_qdel or c.cca == "copa" or c.N > 1
+    rng = np.random.default_rng(args.seed)
+    res = simulate(c, rng.random((args.samples, c.T)), alpha=args.alpha_sim)
+    util = (res.S[:, -1] - res.S[:, 0]) / (c.C * (c.T - 1))
+    util[~res.feasible] = np.inf
+    b = int(np.argmin(util))
+    print(f"{res.feasible.sum()} of {res.B} schedules are feasible. The "
+          f"lowest utilization is {util[b]:.3f} (sample {b})")
+    # The model needs exact arithmetic, so allow for rounding
+    print("Accepted by the SMT model:",
+          check_model(c, res.model(b), tol=1e-9))
+    if args.plot:
+        from plot import plot_model
+        from pyz3_utils import MySolver
+        from variables import Variables, VariableValues
+        m = res.model(b)
+        plot_model(m, c, VariableValues(Variables(c, MySolver()), m))
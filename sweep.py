@@ -0,0 +1,205 @@
+''' Run the same query over a grid of ModelConfig variants in parallel. Z3 is
+single-threaded per query, so fanning queries out to a process pool is the
+only way to use more than one core for a parameter sweep '''
+
+from copy import copy
+from fractions import Fraction
+import itertools
+import json
+import multiprocessing
+from multiprocessing.connection import Connection, wait
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import ModelConfig
+from model import make_solver
+from profiling import QueryProfile, profile_of
+from pyz3_utils import MySolver, run_query
+from query_cache import QueryCache
+from variables import Variables
+
+# Takes a config and returns a solver with the query asserted. Must be a
+# module-level function so it can be pickled and sent to worker processes
+QueryBuilder = Callable[[ModelConfig], Tuple[MySolver, Variables]]
+
+
+def config_grid(base: ModelConfig, **axes: List[Any]) -> List[ModelConfig]:
+    '''Return a copy of `base` for every point in the cartesian product of
+    `axes`. E.g. `config_grid(c, T=[10, 15], buf_min=[0.5, 1, 2])` returns 6
+    configs
+
+    '''
+    keys = list(axes.keys())
+    res = []
+    for vals in itertools.product(*[axes[k] for k in keys]):
+        c = copy(base)
+        for k, val in zip(keys, vals):
+            assert k in c.__dict__, f"ModelConfig has no parameter '{k}'"
+            c.__dict__[k] = val
+        # calculate_qdel is derived from other parameters (see ModelConfig),
+        # so recompute it unless it is being swept explicitly
+        if "calculate_qdel" not in axes:
+            c.calculate_qdel = base.calculate_qdel or c.cca in ["copa"] \
+                or c.N > 1
+        res.append(c)
+    return res
+
+
+def result_to_json(c: ModelConfig, satisfiable: str, elapsed: float,
+                   model: Optional[Dict[str, Any]],
+                   profile: Optional[QueryProfile] = None,
+                   cached: bool = False) -> Dict[str, Any]:
+    '''Convert a result to something `json.dumps` can handle. Fractions are
+    written as strings so no precision is lost. `elapsed` is the solver's
+    time, and `cached` says whether the result came from a QueryCache (in
+    which case `elapsed` is the time it took when it was computed)'''
+    if model is not None:
+        model = {k: (str(x) if type(x) is Fraction else x)
+                 for (k, x) in model.items()}
+    return {
+        "config": {k: (x if type(x) in [int, float, str, bool, type(None)]
+                       else str(x))
+                   for (k, x) in c.to_dict().items()},
+        "satisfiable": satisfiable,
+        "time": elapsed,
+        "model": model,
+        "profile": None if profile is None else profile.to_dict(),
+        "cached": cached,
+    }
+
+
+def run_job(query: QueryBuilder, c: ModelConfig, timeout: float,
+            cache_fname: Optional[str] = None) -> Dict[str, Any]:
+    ''' Build and run one query. This is what runs inside the worker '''
+    s, v = query(c)
+    if cache_fname is None:
+        start = time.time()
+        qres = run_query(c, s, v, timeout)
+        profile = profile_of(s)
+        profile.record_solve(s, time.time() - start)
+        return result_to_json(c, str(qres.satisfiable), time.time() - start,
+                              qres.model, profile)
+    cres = QueryCache(cache_fname).run_query(c, s, v, timeout)
+    return result_to_json(c, cres.satisfiable, cres.solve_time, cres.model,
+                          cres.profile, cres.from_cache)
+
+
+def job_worker(conn: Connection, query: QueryBuilder, c: ModelConfig,
+               timeout: float, cache_fname: Optional[str]):
+    ''' Entry point of the process running one job. Sends back the result,
+    or the error as a string '''
+    try:
+        conn.send(run_job(query, c, timeout, cache_fname))
+    except Exception as e:
+        conn.send(repr(e))
+    conn.close()
+
+
+def run_sweep(query: QueryBuilder, cfgs: List[ModelConfig], out_fname: str,
+              timeout: float, processes: Optional[int] = None,
+              cache_fname: Optional[str] = None,
+              job_timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    '''Run `query` for every config in `cfgs` on `processes` workers (default:
+    one per core). Each query gets `timeout` seconds of solver time; those
+    that run out are reported as 'unknown'. Results are appended to
+    `out_fname` as one JSON object per line as soon as they finish, so a
+    partially complete sweep is still useful. Also returns the results in the
+    order they finished.
+
+    Every job runs in its own process, which is killed if the job (encoding
+    included) takes more than `job_timeout` seconds of wall-clock time
+    (default: twice `timeout` plus a minute). It is then reported as
+    'unknown' with an "error" field, so a stuck job can't hold up the sweep.
+
+    If `cache_fname` is given, queries already answered in that QueryCache
+    are not re-run.
+
+    '''
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if job_timeout is None:
+        job_timeout = 2 * timeout + 60
+    pending = list(cfgs)
+    # Receiving end of the pipe -> (process, config, start time)
+    running: Dict[Connection, Tuple[Any, ModelConfig, float]] = {}
+    res = []
+    with open(out_fname, "a") as f:
+        def finish(r: Dict[str, Any]):
+            print(f"[{len(res) + 1}/{len(cfgs)}] {r['satisfiable']} "
+                  f"in {r['time']:.1f}s")
+            f.write(json.dumps(r) + "\n")
+            f.flush()
+            res.append(r)
+
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < processes:
+                c = pending.pop(0)
+                recv, send = multiprocessing.Pipe(duplex=False)
+                p = multiprocessing.Process(
+                    target=job_worker,
+                    args=(send, query, c, timeout, cache_fname))
+                p.start()
+                # So that recv sees EOF if the worker dies
+                send.close()
+                running[recv] = (p, c, time.time())
+
+            deadline = min([x[2] for x in running.values()]) + job_timeout
+            ready = wait(list(running.keys()),
+                         timeout=max(deadline - time.time(), 0))
+            for conn in ready:
+                p, c, start = running.pop(conn)
+                try:
+                    msg = conn.recv()
+                except EOFError:
+                    msg = f"Worker exited with code {p.exitcode}"
+                conn.close()
+                p.join()
+                if isinstance(msg, str):
+                    # Don't let one broken query take the whole sweep down
+                    r = result_to_json(c, "error", time.time() - start, None)
+                    r["error"] = msg
+                else:
+                    r = msg
+                finish(r)
+
+            for (conn, (p, c, start)) in list(running.items()):
+                if time.time() - start < job_timeout:
+                    continue
+                p.kill()
+                p.join()
+                conn.close()
+                del running[conn]
+                r = result_to_json(c, "unknown", time.time() - start, None)
+                r["error"] = f"Killed after {job_timeout}s"
+                finish(r)
+    return res
+
+
+def aimd_low_util(c: ModelConfig) -> Tuple[MySolver, Variables]:
+    ''' Example query: can AIMD get < 50% utilization with no initial loss? '''
+    s, v, _ = make_solver(c)
+    s.add(v.L[0] == 0)
+    s.add(v.S[-1] - v.S[0] < 0.5 * c.C * (c.T - 1))
+    return (s, v)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(parents=[ModelConfig.get_argparse()])
+    parser.add_argument("--out", type=str, default="sweep.jsonl")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--cache", type=str, default=None)
+    # Wall-clock limit per job, encoding included
+    parser.add_argument("--job-timeout", type=float, default=None)
+    args = parser.parse_args()
+
+    c = ModelConfig.from_argparse(args)
+    c.cca = "aimd"
+    cfgs = config_grid(c, buf_min=[0.5, 1, 2, 3], T=[8, 10])
+    for cfg in cfgs:
+        cfg.buf_max = cfg.buf_min
+    run_sweep(aimd_low_util, cfgs, args.out, args.timeout, args.processes,
+              args.cache, args.job_timeout)
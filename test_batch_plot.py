@@ -0,0 +1,42 @@
+import os
+import pickle as pkl
+import tempfile
+import unittest
+
+from batch_plot import render_dir
+from config import ModelConfig
+from model import make_solver
+from query_cache import QueryCache
+
+
+class TestBatchPlot(unittest.TestCase):
+    def test_render_dir(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.buf_min = 1
+        c.buf_max = 1
+        c.T = 5
+        with tempfile.TemporaryDirectory() as d:
+            cache_dir = os.path.join(d, "cached")
+            out_dir = os.path.join(d, "plots")
+            os.makedirs(cache_dir)
+            cache = QueryCache(os.path.join(d, "results.db"))
+            for (name, thresh) in [("a", 0.5), ("b", 0.4)]:
+                s, v, _ = make_solver(c)
+                s.add(v.S[-1] - v.S[0] < thresh * c.C * (c.T - 1))
+                qres = cache.run_query(c, s, v, 60)
+                self.assertEqual(qres.satisfiable, "sat")
+                with open(os.path.join(cache_dir, f"{name}.cached"),
+                          "wb") as f:
+                    pkl.dump(qres, f)
+
+            rendered = render_dir(cache_dir, out_dir, processes=2)
+            self.assertEqual([r.satisfiable for r in rendered],
+                             ["sat", "sat"])
+            for name in ["a.png", "a.txt", "b.png", "b.txt", "index.html"]:
+                self.assertTrue(os.path.exists(os.path.join(out_dir, name)),
+                                name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from benchmark import Benchmark, aimd_low_util, compare, run_suite
+from config import ModelConfig
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare(self):
+        baseline = {
+            "a": {"encode_time": 1, "solve_time": 10, "peak_rss": 1000,
+                  "satisfiable": "sat"},
+            "b": {"encode_time": 0.1, "solve_time": 0.1, "peak_rss": 1000,
+                  "satisfiable": "unsat"},
+        }
+        # Within the threshold, and too small to count
+        results = {
+            "a": {"encode_time": 1.1, "solve_time": 11, "peak_rss": 1100,
+                  "satisfiable": "sat"},
+            "b": {"encode_time": 0.1, "solve_time": 0.5, "peak_rss": 1000,
+                  "satisfiable": "unsat"},
+            "new": {"encode_time": 1, "solve_time": 1, "peak_rss": 1000,
+                    "satisfiable": "sat"},
+        }
+        self.assertEqual(compare(results, baseline), [])
+
+        results["a"]["solve_time"] = 13
+        results["b"]["satisfiable"] = "unknown"
+        self.assertEqual(len(compare(results, baseline)), 2)
+
+    def test_run_suite(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.buf_min = 1
+        c.buf_max = 1
+        c.T = 5
+        res = run_suite([Benchmark("tiny", c, aimd_low_util)], timeout=60,
+                        repeat=2)
+        self.assertEqual(list(res.keys()), ["tiny"])
+        r = res["tiny"]
+        self.assertEqual(set(r.keys()), set(["encode_time", "solve_time",
+                                             "peak_rss", "satisfiable"]))
+        self.assertEqual(r["satisfiable"], "sat")
+        self.assertGreater(r["encode_time"], 0)
+        self.assertGreater(r["peak_rss"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -46,6 +46,28 @@ class TestCCAAimd(unittest.TestCase):
         sat = s.check()
         self.assertEqual(str(sat), "unsat")
 
+    def test_can_incr_linear(self):
+        # Both encodings agree on every trace
+        for T in [3, 6, 10]:
+            c = ModelConfig.default()
+            c.T = T
+            s = MySolver()
+            v = Variables(c, s)
+            monotone(c, s, v)
+            initial(c, s, v)
+            relate_tot(c, s, v)
+            network(c, s, v)
+            cwnd_rate_arrival(c, s, v)
+
+            cv = AIMDVariables(c, s)
+            can_incr(c, s, v, cv)
+            c.aimd_incr_encoding = "linear"
+            cv_lin = AIMDVariables(c, s, "lin")
+            can_incr(c, s, v, cv_lin)
+            s.add(Or([cv.incr_f[0][t] != cv_lin.incr_f[0][t]
+                      for t in range(1, c.T)]))
+            self.assertEqual(str(s.check()), "unsat")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from z3 import If, Or
+
+from config import ModelConfig
+from model import make_solver
+
+
+class TestCCABBR(unittest.TestCase):
+    def test_max_rate(self):
+        # The sliding window max agrees with the max computed from scratch
+        for max_R in [1, 3, 4]:
+            c = ModelConfig.default()
+            c.cca = "bbr"
+            c.T = 12
+            c.bbr_max_R = max_R
+            s, v, _ = make_solver(c)
+
+            P = c.R
+            diffs = []
+            for t in range(c.R + P, c.T):
+                rates = [(v.S_f[0][t-dt-c.R] - v.S_f[0][t-dt-c.R-P]) / P
+                         for dt in range(min(t-c.R-P+1, max_R))]
+                expected = rates[0]
+                for rate in rates[1:]:
+                    expected = If(rate > expected, rate, expected)
+                diffs.append(s.Real(f"max_rate_0,{t}") != expected)
+            s.add(Or(*diffs))
+            self.assertEqual(str(s.check()), "unsat")
+
+
+if __name__ == "__main__":
+    unittest.main()
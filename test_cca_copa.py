@@ -0,0 +1,80 @@
+import unittest
+from z3 import And, Not, Or, Xor
+
+from cca_copa import allowed_disjunction, allowed_linear
+from config import ModelConfig
+from model import make_solver
+
+
+class TestCCACopa(unittest.TestCase):
+    def test_allowed_linear(self):
+        # Both encodings allow the same moves on every trace
+        for T in [4, 7, 10]:
+            c = ModelConfig.default()
+            c.cca = "any"
+            c.calculate_qdel = True
+            c.qdel_encoding = "index"
+            c.T = T
+            s, v, _ = make_solver(c)
+            diffs = []
+            for t in range(c.R + c.D, c.T):
+                incr, decr = allowed_disjunction(c, s, v, 0, t)
+                incr_lin, decr_lin = allowed_linear(c, v, 0, t)
+                diffs += [Xor(incr, incr_lin), Xor(decr, decr_lin)]
+            s.add(Or(*diffs))
+            self.assertEqual(str(s.check()), "unsat")
+
+    def test_allowed_linear_D2(self):
+        # With D = 2, Copa may react to either of the last two delay samples.
+        # Compare with the disjunction over both samples and every delay
+        for T in [6, 9]:
+            c = ModelConfig.default()
+            c.cca = "any"
+            c.calculate_qdel = True
+            c.qdel_encoding = "index"
+            c.D = 2
+            c.T = T
+            s, v, _ = make_solver(c)
+            diffs = []
+            for t in range(c.R + c.D, c.T):
+                cwnd = v.c_f[0][t-1]
+                moved = v.S[t-c.R] > v.S[t-c.R-1]
+                incr = And(moved, Or([
+                    And(v.qdel_is(t-c.R-d, dt),
+                        cwnd * max(0, dt-1)
+                        <= v.alpha * (c.R + max(0, dt-1)))
+                    for d in range(c.D) for dt in range(t-c.R-d+1)]))
+                decr = Or(And(moved, Or([
+                    And(v.qdel_is(t-c.R-d-1, dt),
+                        cwnd * dt >= v.alpha * (c.R + dt))
+                    for d in range(c.D) for dt in range(t-c.R-d)])),
+                    v.S[t-c.R] < v.A[0] - v.L[0])
+                incr_lin, decr_lin = allowed_linear(c, v, 0, t)
+                diffs += [Xor(incr, incr_lin), Xor(decr, decr_lin)]
+            s.add(Or(*diffs))
+            self.assertEqual(str(s.check()), "unsat")
+
+        # Which is more permissive than looking at the last sample alone
+        c.D = 1
+        s, v, _ = make_solver(c)
+        t = c.T - 1
+        incr_D1, _ = allowed_linear(c, v, 0, t)
+        c.D = 2
+        incr_D2, _ = allowed_linear(c, v, 0, t)
+        s.add(And(incr_D2, Not(incr_D1)))
+        self.assertEqual(str(s.check()), "sat")
+
+    def test_large_D(self):
+        c = ModelConfig.default()
+        c.cca = "copa"
+        c.calculate_qdel = True
+        c.copa_encoding = "linear"
+        c.qdel_encoding = "index"
+        c.D = 2
+        c.T = 8
+        s, v, _ = make_solver(c)
+        self.assertEqual(str(s.check()), "sat")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,15 @@
+from fractions import Fraction
+import numpy as np
+import time
 import unittest
-from clean_output import LinearVars, eval_smt, anded_constraints, \
-    get_linear_vars, substitute_if
-from z3 import And, Bool, If, Implies, Or, Real, Solver
+from clean_output import LinearVars, eval_smt, anded_constraints, face_point, \
+    get_linear_vars, simplify_solution, simplify_solution_lp, \
+    smoothness_operator, solver_constraints, substitute_if
+from config import ModelConfig
+from model import make_solver
+from utils import model_to_dict
+from z3 import And, Bool, If, Implies, Not, Or, Real, RealVal, Solver, sat, \
+    simplify, substitute
 
 
 class TestCleanOutput(unittest.TestCase):
@@ -18,6 +26,34 @@ class TestCleanOutput(unittest.TestCase):
         self.assertTrue(eval_smt({"a": 0, "b": 1, "x": False, "y": True},
                         s.assertions()))
 
+    def test_eval_smt_shared(self):
+        # Every step uses the previous one four times, so evaluating the
+        # tree instead of the DAG would take 4^n steps. Deep enough to
+        # overflow Python's recursion limit if walked recursively
+        x, b = Real("x"), Bool("b")
+        e = x
+        for i in range(1500):
+            e = If(And(e >= 0, b), e - e + e + 1, e * 2 + e)
+        start = time.time()
+        self.assertEqual(eval_smt({"x": Fraction(1, 2), "b": True}, e),
+                         Fraction(3001, 2))
+        self.assertLess(time.time() - start, 10)
+
+        # Agrees with z3's own evaluation. A shared cache gives the same
+        # answers
+        e = x
+        for i in range(40):
+            e = If(e * 3 > i, e - e / 2 + x, e + i)
+        for val in [Fraction(-7, 3), Fraction(0), Fraction(5, 4)]:
+            m = {"x": val, "b": True}
+            expected = simplify(substitute(
+                e, (x, RealVal(str(val))))).as_fraction()
+            self.assertEqual(eval_smt(m, e), expected)
+            cache = {}
+            self.assertEqual(eval_smt(m, e >= 1, cache), expected >= 1)
+            # Already in the cache, as a subterm of the above
+            self.assertEqual(eval_smt(m, e, cache), expected)
+
     def test_anded_constraints(self):
         s = Solver()
         e1 = Real("a") < Real("b")
@@ -54,24 +90,120 @@ class TestCleanOutput(unittest.TestCase):
             LinearVars({"a": 1, "b": -2, "c": -1}, -0.5)
         )
 
+    def assertSubstituted(self, res, expr, conds):
+        # z3's == builds an expression rather than comparing, so use eq
+        self.assertTrue(res[0].eq(expr), f"{res[0]} != {expr}")
+        self.assertEqual([str(x) for x in res[1]], [str(x) for x in conds])
+
     def test_substitute_if(self):
-        e = If(Real("a") < Real("b"), Real("a"), Real("b"))
-        self.assertEqual(
-            substitute_if({"a": 0, "b": 1}, e),
-            (Real("a"), [Real("a") < Real("b")])
-        )
-        self.assertEqual(
-            substitute_if({"a": 1, "b": 0}, e),
-            (Real("b"), [Real("a") < Real("b")])
-        )
-        self.assertEqual(
-            substitute_if({"a": 1, "b": 1}, Real("c") == e),
-            (Real("c") == Real("b"), [Real("a") < Real("b")])
-        )
-        self.assertEqual(
-            substitute_if({"a": 1, "b": 1}, Real("a") + Real("b") >= 0),
-            (Real("a") + Real("b") >= 0, [])
-        )
+        a, b, c = Real("a"), Real("b"), Real("c")
+        e = If(a < b, a, b)
+        self.assertSubstituted(substitute_if({"a": 0, "b": 1}, e),
+                               a, [a < b])
+        self.assertSubstituted(substitute_if({"a": 1, "b": 0}, e),
+                               b, [Not(a < b)])
+        self.assertSubstituted(substitute_if({"a": 1, "b": 1}, c == e),
+                               c == b, [Not(a < b)])
+        self.assertSubstituted(
+            substitute_if({"a": 1, "b": 1}, a + b >= 0), a + b >= 0, [])
+
+        # Nested: the inner If is only resolved if its branch is taken
+        nested = If(a < b, If(b < c, b, c), a)
+        self.assertSubstituted(
+            substitute_if({"a": 0, "b": 1, "c": 2}, nested),
+            b, [b < c, a < b])
+        self.assertSubstituted(
+            substitute_if({"a": 2, "b": 1, "c": 0}, nested), a, [Not(a < b)])
+        # An If in the condition
+        self.assertSubstituted(
+            substitute_if({"a": 0, "b": 1, "c": 2}, If(e < c, c, b) > 0),
+            c > 0, [a < b, a < c])
+
+        # A shared If is rewritten once, and its condition is given once
+        self.assertSubstituted(
+            substitute_if({"a": 0, "b": 1, "c": 2}, And(e < c, c - e > 0)),
+            And(a < c, c - a > 0), [a < b])
+
+    def test_substitute_if_deep(self):
+        # Deep enough to overflow Python's recursion limit if walked
+        # recursively
+        x = Real("x")
+        e = x
+        for i in range(5000):
+            e = If(x > i, e + 1, e)
+        res, conds = substitute_if({"x": Fraction(-1)}, e >= 0)
+        self.assertTrue(res.eq(x >= 0))
+        self.assertEqual(len(conds), 5000)
+
+    def test_simplify_solution_lp(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.T = 8
+        s, v, _ = make_solver(c)
+        s.add(v.S[-1] - v.S[0] < 0.5 * c.C * c.T)
+        self.assertEqual(s.check(), sat)
+        m = model_to_dict(s.model())
+
+        res = simplify_solution_lp(c, m, s.assertions())
+        # The output must be exact, not merely close to feasible
+        self.assertTrue(eval_smt(res, s.assertions()))
+        self.assertTrue(all([type(res[x]) in [Fraction, bool] for x in res]))
+
+    def test_simplify_solution(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.T = 8
+        s, v, _ = make_solver(c)
+        s.add(v.S[-1] - v.S[0] < 0.5 * c.C * c.T)
+        self.assertEqual(s.check(), sat)
+        m = model_to_dict(s.model())
+
+        # The linear constraints the solution is searched within
+        new_assertions, conds = substitute_if(m, s.assertions())
+        anded = anded_constraints(m, And(new_assertions, And(conds)))
+        constraints, vars = solver_constraints(anded)
+        D = smoothness_operator(c, vars)
+
+        def as_vector(sol):
+            return np.asarray([sol[x] for x in vars], dtype=float)
+
+        init_score = np.sum((D @ as_vector(m)) ** 2)
+        for method in ["SLSQP", "trust-constr"]:
+            res = simplify_solution(c, m, s.assertions(), method)
+            self.assertTrue(all([x in res for x in vars]))
+            x = as_vector(res)
+            for cons in constraints:
+                self.assertTrue(np.all(cons.A @ x <= cons.ub + 1e-4))
+                self.assertTrue(np.all(cons.A @ x >= cons.lb - 1e-4))
+            self.assertLessEqual(np.sum((D @ x) ** 2), init_score + 1e-6)
+
+    def test_simplify_unsupported_encoding(self):
+        c = ModelConfig.default()
+        c.loss_detected_encoding = "frontier"
+        for method in ["SLSQP", "lp"]:
+            with self.assertRaises(ValueError):
+                simplify_solution(c, {}, And(Real("a") > 0), method)
+
+        c = ModelConfig.default()
+        c.calculate_qdel = True
+        c.qdel_encoding = "index"
+        for method in ["SLSQP", "lp"]:
+            with self.assertRaises(ValueError):
+                simplify_solution(c, {}, And(Real("a") > 0), method)
+
+    def test_face_point(self):
+        a, b, c = Real("a"), Real("b"), Real("c")
+        # The strict a > 0 and both of the others are tight at x
+        anded = [a > 0, b >= 2 * a + 3, b + c <= 10, c <= 100, b <= 100]
+        constraints, vars = solver_constraints(anded)
+        x = np.zeros(len(vars))
+        x[vars["a"]] = 1e-6
+        x[vars["b"]] = 3 + 2e-6
+        x[vars["c"]] = 7 - 2e-6
+        res = face_point(anded, constraints[1], x)
+        self.assertGreater(res["a"], 0)
+        self.assertEqual(res["b"], 2 * res["a"] + 3)
+        self.assertEqual(res["b"] + res["c"], 10)
 
 
 if __name__ == "__main__":
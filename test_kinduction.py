@@ -0,0 +1,67 @@
+import unittest
+from z3 import And, Real
+
+from config import ModelConfig
+from kinduction import prove_invariant
+
+
+def swap_x(t: int):
+    return Real(f"swap_x_{t}")
+
+
+def swap_y(t: int):
+    return Real(f"swap_y_{t}")
+
+
+def swap(c, s, v):
+    ''' A toy system on top of the model that swaps x and y every step '''
+    for t in range(1, c.T):
+        s.add(swap_x(t) == swap_y(t - 1))
+        s.add(swap_y(t) == swap_x(t - 1))
+
+
+class TestKInduction(unittest.TestCase):
+    def test_const_cwnd(self):
+        c = ModelConfig.default()
+        c.cca = "const"
+        # Trivially inductive
+        res = prove_invariant(c, lambda c, v, t: v.c_f[0][t] == v.alpha,
+                              max_k=2, timeout=60)
+        self.assertEqual((res.verdict, res.k), ("proven", 1))
+
+    def test_false_invariant(self):
+        c = ModelConfig.default()
+        c.cca = "const"
+        # Service can grow, so the base case finds a counter-example
+        res = prove_invariant(c, lambda c, v, t: v.S[t] == v.S[0], dur=0,
+                              max_k=4, timeout=60)
+        self.assertEqual((res.verdict, res.k), ("refuted", 2))
+        self.assertNotEqual(res.counter_example["tot_service_1"],
+                            res.counter_example["tot_service_0"])
+
+    def test_needs_k_2(self):
+        c = ModelConfig.default()
+        c.cca = "const"
+
+        # x >= 0 doesn't say anything about y, and y becomes the next x. But
+        # x >= 0 at two consecutive steps covers both
+        def invariant(c, v, t):
+            return swap_x(t) >= 0
+
+        def initial(c, v, t):
+            return And(swap_x(t) >= 0, swap_y(t) >= 0)
+
+        res = prove_invariant(c, invariant, swap, max_k=1, timeout=60,
+                              initial=initial)
+        self.assertEqual((res.verdict, res.k), ("unknown", None))
+        res = prove_invariant(c, invariant, swap, max_k=4, timeout=60,
+                              initial=initial)
+        self.assertEqual((res.verdict, res.k), ("proven", 2))
+
+        # Starting from x >= 0 alone, y < 0 breaks it right away
+        res = prove_invariant(c, invariant, swap, max_k=4, timeout=60)
+        self.assertEqual((res.verdict, res.k), ("refuted", 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
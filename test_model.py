@@ -1,9 +1,10 @@
 import unittest
-from z3 import And, Implies, Or
+from z3 import And, Function, If, Implies, IntSort, Not, Or, RealSort, Sum, \
+    Xor
 
 from config import ModelConfig
-from model import Variables, calculate_qdel, initial, monotone, make_solver, \
-    network, relate_tot
+from model import Variables, calculate_qdel, horizon_dependent, initial, \
+    loss_detected, monotone, make_solver, network, relate_tot
 from pyz3_utils import MySolver
 
 
@@ -106,6 +107,140 @@ class TestModel(unittest.TestCase):
 
         self.assertEqual(str(sat), "unsat")
 
+    def test_qdel_index(self):
+        c = ModelConfig.default()
+        c.calculate_qdel = True
+        c.qdel_encoding = "index"
+        s = MySolver()
+        v = Variables(c, s)
+
+        monotone(c, s, v)
+        initial(c, s, v)
+        relate_tot(c, s, v)
+        network(c, s, v)
+        calculate_qdel(c, s, v)
+
+        # Bytes are served in FIFO order, so the input time of the fresh
+        # bytes being served never goes back
+        conds = []
+        for t1 in range(1, c.T):
+            for t2 in range(t1 + 1, c.T):
+                conds.append(And(v.S[t1] != v.S[t1-1], v.S[t2] != v.S[t2-1],
+                                 v.qdel_index[t2] < v.qdel_index[t1]))
+        s.add(Or(*conds))
+        sat = s.check()
+        self.assertEqual(str(sat), "unsat")
+
+    def test_qdel_encodings_agree(self):
+        c_matrix = ModelConfig.default()
+        c_matrix.calculate_qdel = True
+        c_index = ModelConfig.default()
+        c_index.calculate_qdel = True
+        c_index.qdel_encoding = "index"
+        s = MySolver()
+        # Both share the network's variables, since they have the same names
+        v_matrix = Variables(c_matrix, s)
+        v_index = Variables(c_index, s)
+
+        monotone(c_matrix, s, v_matrix)
+        initial(c_matrix, s, v_matrix)
+        relate_tot(c_matrix, s, v_matrix)
+        network(c_matrix, s, v_matrix)
+        calculate_qdel(c_matrix, s, v_matrix)
+        calculate_qdel(c_index, s, v_index)
+
+        # The matrix encoding wraps around at t = 0, so if nothing is served
+        # over the whole horizon, its delays are arbitrary
+        s.add(v_matrix.S[-1] > v_matrix.S[0])
+        s.add(Or(*[Xor(v_matrix.qdel_is(t, dt), v_index.qdel_is(t, dt))
+                   for t in range(c_matrix.T) for dt in range(c_matrix.T)]))
+        sat = s.check()
+        self.assertEqual(str(sat), "unsat")
+
+    def test_loss_detected_frontier(self):
+        c = ModelConfig.default()
+        c.T = 6
+
+        def encode(encoding: str):
+            c.loss_detected_encoding = encoding
+            s = MySolver()
+            v = Variables(c, s)
+            loss_detected(c, s, v)
+            return And(s.s.assertions())
+
+        pairwise = encode("pairwise")
+        frontier = encode("frontier")
+
+        # The frontier encoding implies the pairwise one
+        s = MySolver()
+        v = Variables(c, s)
+        monotone(c, s, v)
+        s.add(frontier)
+        s.add(Not(pairwise))
+        self.assertEqual(str(s.check()), "unsat")
+
+        # The pairwise encoding implies the frontier one when the auxiliary
+        # variables take their intended values
+        s = MySolver()
+        v = Variables(c, s)
+        monotone(c, s, v)
+        s.add(pairwise)
+        inp = Function("ld_inp_0", IntSort(), RealSort())
+        lost = Function("ld_lost_0", IntSort(), RealSort())
+        for t in range(c.T):
+            s.add(inp(t) == v.A_f[0][t] - v.L_f[0][t])
+            s.add(lost(t) == v.L_f[0][t])
+        for t in range(c.R, c.T):
+            frontier_t = s.Int(f"ld_frontier_0,{t}")
+            s.add(frontier_t == Sum([
+                If(v.A_f[0][u] - v.L_f[0][u] + v.dupacks <= v.S_f[0][t-c.R],
+                   1, 0)
+                for u in range(t - c.R + 1)]) - 1)
+        s.add(Not(frontier))
+        self.assertEqual(str(s.check()), "unsat")
+
+    def test_extend_horizon(self):
+        for cca in ["aimd", "bbr", "copa"]:
+            c = ModelConfig.default()
+            c.cca = cca
+            c.calculate_qdel = cca == "copa"
+            c.qdel_encoding = "index"
+
+            # Build up to T = 7 in steps
+            s, v = None, None
+            prev = 0
+            for T in [3, 5, 7]:
+                c.T = T
+                s, v, _ = make_solver(c, s, v, t0=prev)
+                prev = T
+            horizon_dependent(c, s, v)
+            incremental = And(s.s.assertions())
+
+            full, _, _ = make_solver(c)
+            s = MySolver()
+            s.add(incremental != And(full.s.assertions()))
+            self.assertEqual(str(s.check()), "unsat")
+
+    def test_symmetry_breaking(self):
+        c = ModelConfig.default()
+        c.N = 2
+        c.T = 5
+        c.cca = "aimd"
+        c.calculate_qdel = True
+        c.symmetry_breaking = True
+
+        # Flows are sorted by initial state
+        s, v, _ = make_solver(c)
+        s.add(v.c_f[0][0] > v.c_f[1][0])
+        self.assertEqual(str(s.check()), "unsat")
+
+        # But a query that treats flows alike is unaffected
+        s, v, _ = make_solver(c)
+        s.add(v.c_f[0][0] != v.c_f[1][0])
+        s.add(Or(v.S_f[0][-1] - v.S_f[1][-1] > 1,
+                 v.S_f[1][-1] - v.S_f[0][-1] > 1))
+        self.assertEqual(str(s.check()), "sat")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,62 @@
+from fractions import Fraction
+import numpy as np
+import unittest
+
+from config import ModelConfig
+from model_trace import Trace, parse_name, qdel_range
+
+
+class TestModelTrace(unittest.TestCase):
+    def test_parse_name(self):
+        self.assertEqual(parse_name("cwnd_0,3"), ("", "cwnd", (0, 3)))
+        self.assertEqual(parse_name("tot_arrival_12"),
+                         ("", "tot_arrival", (12,)))
+        self.assertEqual(parse_name("qdel_index_2"), ("", "qdel_index", (2,)))
+        self.assertEqual(parse_name("f1__incr_allowed_1,2,0"),
+                         ("f1", "incr_allowed", (1, 2, 0)))
+        self.assertEqual(parse_name("alpha"), ("", "alpha", ()))
+
+    def test_trace(self):
+        c = ModelConfig.default()
+        c.N = 2
+        c.T = 3
+        m = {"alpha": Fraction(1, 2), "x__cwnd_0,0": Fraction(5)}
+        for t in range(c.T):
+            m[f"tot_service_{t}"] = Fraction(t, 3)
+            m[f"timeout_1,{t}"] = t == 1
+            for n in range(c.N):
+                m[f"cwnd_{n},{t}"] = Fraction(n + t)
+
+        tr = Trace(c, m)
+        self.assertEqual(tr.c_f.shape, (2, 3))
+        self.assertTrue(np.array_equal(tr.c_f, [[0, 1, 2], [1, 2, 3]]))
+        self.assertTrue(np.allclose(tr.S, [0, 1 / 3, 2 / 3]))
+        self.assertEqual(tr.timeout_f.dtype, bool)
+        self.assertEqual(list(tr.timeout_f[1]), [False, True, False])
+        self.assertEqual(list(tr.timeout_f[0]), [False, False, False])
+        # Missing series are NaN
+        self.assertTrue(np.all(np.isnan(tr.A)))
+        self.assertEqual(tr.scalar("alpha"), Fraction(1, 2))
+
+        exact = Trace(c, m, exact=True)
+        self.assertEqual(exact.S[1], Fraction(1, 3))
+        self.assertEqual(Trace(c, m, pre="x").c_f[0, 0], Fraction(5))
+
+    def test_qdel_range(self):
+        inp = np.array([2, 2, 4, 6, 6, 7])
+        out = np.array([1, 2, 2, 3, 6, 7])
+        low, high = qdel_range(inp, out)
+        # t=0: input before t=0. t=1: input exactly at 0. t=2: nothing
+        # served. t=3: input between 1 and 2. t=4: the plateau at 6 started
+        # at 3. t=5: exactly at 5
+        self.assertEqual(list(low), [0, 1, 1, 1, 1, 0])
+        self.assertEqual(list(high), [np.inf, 1, 1, 2, 1, 0])
+
+        # Leading dimensions are independent
+        low2, high2 = qdel_range(np.stack([inp, inp]), np.stack([out, out]))
+        self.assertEqual(low2.shape, (2, 6))
+        self.assertTrue(np.array_equal(high2[1], high))
+
+
+if __name__ == "__main__":
+    unittest.main()
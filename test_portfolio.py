@@ -0,0 +1,33 @@
+import unittest
+
+from config import ModelConfig
+from model import make_solver
+from portfolio import DEFAULT_PORTFOLIO, SolverConfig, run_portfolio_query
+
+
+class TestPortfolio(unittest.TestCase):
+    def test_solver_config_params(self):
+        params = {"smt.random_seed": 1}
+        a = SolverConfig("a", params)
+        params["smt.random_seed"] = 2
+        b = SolverConfig("b")
+        b.params["sat.random_seed"] = 3
+        self.assertEqual(a.params, {"smt.random_seed": 1})
+        self.assertEqual(SolverConfig("c").params, {})
+
+    def test_run_portfolio_query(self):
+        c = ModelConfig.default()
+        c.cca = "const"
+        c.T = 4
+        s, v, _ = make_solver(c)
+        s.add(v.S[-1] > v.S[0])
+        res = run_portfolio_query(c, s, v, timeout=60)
+        self.assertEqual(res.satisfiable, "sat")
+        self.assertIn(res.winner, [sc.name for sc in DEFAULT_PORTFOLIO])
+        self.assertIsNotNone(res.model)
+        self.assertGreater(res.model["tot_service_3"],
+                           res.model["tot_service_0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
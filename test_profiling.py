@@ -0,0 +1,43 @@
+import unittest
+from z3 import sat
+
+from config import ModelConfig
+from model import make_solver
+from profiling import QueryProfile, profile_of
+
+
+class TestProfiling(unittest.TestCase):
+    def test_families_cover_assertions(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.T = 6
+        s, v, _ = make_solver(c)
+        prof = profile_of(s)
+        self.assertIn("cca_aimd", prof.families)
+        self.assertEqual(
+            sum([x.assertions for x in prof.families.values()]),
+            len(s.s.assertions()))
+
+        prof.count_variables(s)
+        self.assertGreater(prof.families["monotone"].variables, 0)
+        self.assertEqual(s.check(), sat)
+        prof.record_solve(s, 0.1)
+        self.assertIn("time", prof.z3_stats)
+
+        # Symmetry breaking is profiled separately from multi_flows
+        c = ModelConfig.default()
+        c.N = 2
+        c.T = 5
+        c.calculate_qdel = True
+        c.symmetry_breaking = True
+        s, v, _ = make_solver(c)
+        self.assertGreater(
+            profile_of(s).families["symmetry_breaking"].assertions, 0)
+
+        # Round-trips through the form stored by QueryCache
+        prof2 = QueryProfile.from_dict(prof.to_dict())
+        self.assertEqual(prof2.to_dict(), prof.to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+from fractions import Fraction
+import os
+import tempfile
+import unittest
+import z3
+
+from config import ModelConfig
+from model import make_solver
+from pyz3_utils import MySolver
+from query_cache import QueryCache, assertions_hash, query_key
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.dir.name, "results.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def query(self, c: ModelConfig, thresh: float = 0.5):
+        s, v, _ = make_solver(c)
+        s.add(v.L[0] == 0)
+        s.add(v.S[-1] - v.S[0] < thresh * c.C * (c.T - 1))
+        return (s, v)
+
+    def config(self) -> ModelConfig:
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.buf_min = 1
+        c.buf_max = 1
+        c.T = 5
+        return c
+
+    def test_key(self):
+        c = self.config()
+        key = query_key(c, self.query(c)[0])
+        # Building the same query again gives the same key
+        self.assertEqual(query_key(c, self.query(c)[0]), key)
+        # Changing an assertion changes it
+        self.assertNotEqual(query_key(c, self.query(c, 0.4)[0]), key)
+        # So does changing the config, even if the assertions don't change
+        c2 = self.config()
+        c2.simplify = not c.simplify
+        self.assertNotEqual(query_key(c2, self.query(c)[0]), key)
+
+    def test_hit_miss(self):
+        c = self.config()
+        cache = QueryCache(self.fname)
+        s, v = self.query(c)
+        first = cache.run_query(c, s, v, 60)
+        self.assertFalse(first.from_cache)
+        self.assertEqual(first.satisfiable, "sat")
+
+        # A fresh connection to the same file finds it
+        s, v = self.query(c)
+        second = QueryCache(self.fname).run_query(c, s, v, 60)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.key, first.key)
+        self.assertEqual(second.solve_time, first.solve_time)
+        self.assertIsNotNone(second.profile)
+
+        # A different query misses
+        s, v = self.query(c, 0.4)
+        self.assertFalse(cache.run_query(c, s, v, 60).from_cache)
+        self.assertEqual(len(cache.results_for(c)), 2)
+        self.assertEqual(len(cache.results_for(self.config())), 2)
+        c.T = 6
+        self.assertEqual(cache.results_for(c), [])
+
+    def test_unknown_needs_longer_timeout(self):
+        c = self.config()
+        cache = QueryCache(self.fname)
+        cache.put("k", c, "unknown", None, 1, 1)
+        self.assertIsNotNone(cache.get("k", 1))
+        self.assertIsNone(cache.get("k", 10))
+
+    def test_model_round_trip(self):
+        c = self.config()
+        cache = QueryCache(self.fname)
+        model = {"x": Fraction(1, 3), "y": True, "z": Fraction(-7, 2)}
+        cache.put("k", c, "sat", model, 1, 10)
+        row = cache.get("k")
+        self.assertEqual(row["model"], model)
+        self.assertEqual(type(row["model"]["x"]), Fraction)
+        self.assertEqual(cache.results_for(c)[0]["model"], model)
+
+        s, v = self.query(c)
+        res = cache.run_query(c, s, v, 60)
+        self.assertEqual(cache.get(res.key)["model"], res.model)
+
+    def test_deep_assertion(self):
+        s = MySolver()
+        x = z3.Real("x")
+        e = x
+        for i in range(20000):
+            e = e + i
+        s.add(e > 0)
+        self.assertEqual(len(assertions_hash(s)), 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
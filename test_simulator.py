@@ -0,0 +1,59 @@
+import numpy as np
+import unittest
+
+from config import ModelConfig
+from model_trace import Trace
+from simulator import check_model, simulate
+
+
+class TestSimulator(unittest.TestCase):
+    def check(self, c: ModelConfig, tol: float = 0):
+        rng = np.random.default_rng(0)
+        # Multiples of 1/4 and 1/8 keep the arithmetic exact
+        res = simulate(c, rng.integers(0, 5, size=(8, c.T)) / 4,
+                       alpha=0.125, cwnd0=rng.integers(1, 16, size=8) / 4)
+        self.assertTrue(np.any(res.feasible))
+        for b in range(res.B):
+            self.assertEqual(check_model(c, res.model(b), tol),
+                             res.feasible[b])
+
+    def test_aimd(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.T = 8
+        c.buf_min = 0.5
+        c.buf_max = 0.5
+        self.check(c)
+
+    def test_copa(self):
+        c = ModelConfig.default()
+        c.cca = "copa"
+        c.T = 8
+        c.calculate_qdel = True
+        c.qdel_encoding = "index"
+        c.copa_encoding = "linear"
+        c.D = 2
+        self.check(c)
+
+    def test_bbr(self):
+        c = ModelConfig.default()
+        c.cca = "bbr"
+        c.T = 8
+        c.buf_min = 1
+        c.buf_max = 1
+        # The pacing gain of 0.8 isn't exact in floating point
+        self.check(c, tol=1e-9)
+
+    def test_trace(self):
+        c = ModelConfig.default()
+        c.cca = "const"
+        c.N = 2
+        c.calculate_qdel = True
+        res = simulate(c, np.ones((1, c.T)))
+        tr = Trace(c, res.model(0))
+        self.assertTrue(np.allclose(tr.S_f, res.S_f[0]))
+        self.assertTrue(np.allclose(tr.S, res.S_f[0].sum(axis=0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import time
+from typing import Tuple
+import unittest
+
+from config import ModelConfig
+from pyz3_utils import MySolver
+from sweep import aimd_low_util, config_grid, run_sweep
+from variables import Variables
+
+
+def stuck(c: ModelConfig) -> Tuple[MySolver, Variables]:
+    ''' A query whose encoding never finishes '''
+    time.sleep(600)
+    raise AssertionError("unreachable")
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.buf_min = 1
+        c.buf_max = 1
+        c.T = 5
+        self.cfgs = config_grid(c, buf_min=[1, 2])
+        for cfg in self.cfgs:
+            cfg.buf_max = cfg.buf_min
+
+    def test_sweep(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, "sweep.jsonl")
+            res = run_sweep(aimd_low_util, self.cfgs, out, 60, processes=2)
+            self.assertEqual(len(res), 2)
+            self.assertEqual(sorted([r["config"]["buf_min"] for r in res]),
+                             [1, 2])
+            for r in res:
+                self.assertIn(r["satisfiable"], ["sat", "unsat"])
+                self.assertFalse(r["cached"])
+            with open(out) as f:
+                self.assertEqual(len(f.readlines()), 2)
+
+    def test_sweep_cache(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, "sweep.jsonl")
+            cache = os.path.join(d, "results.db")
+            first = run_sweep(aimd_low_util, self.cfgs, out, 60, processes=2,
+                              cache_fname=cache)
+            self.assertFalse(any([r["cached"] for r in first]))
+            second = run_sweep(aimd_low_util, self.cfgs, out, 60,
+                               processes=2, cache_fname=cache)
+            self.assertTrue(all([r["cached"] for r in second]))
+
+            # The cached results report the original solve time
+            def by_buf(rs):
+                return {r["config"]["buf_min"]: r for r in rs}
+            first, second = by_buf(first), by_buf(second)
+            for k in first:
+                self.assertEqual(first[k]["satisfiable"],
+                                 second[k]["satisfiable"])
+                self.assertEqual(first[k]["time"], second[k]["time"])
+            with open(out) as f:
+                self.assertEqual(len([json.loads(x) for x in f]), 4)
+
+    def test_job_timeout(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = os.path.join(d, "sweep.jsonl")
+            start = time.time()
+            res = run_sweep(stuck, self.cfgs, out, 1, processes=2,
+                            job_timeout=1)
+            self.assertLess(time.time() - start, 30)
+            self.assertEqual([r["satisfiable"] for r in res],
+                             ["unknown", "unknown"])
+            self.assertIn("error", res[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
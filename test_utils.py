@@ -0,0 +1,50 @@
+import unittest
+
+from config import ModelConfig
+from model import make_solver
+from pyz3_utils import BinarySearch
+from utils import find_bound, find_bound_incremental
+
+
+class TestUtils(unittest.TestCase):
+    def test_find_bound_incremental(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.buf_min = 1
+        c.buf_max = 1
+        c.T = 6
+
+        def base_cons(c: ModelConfig):
+            s, v, _ = make_solver(c)
+            s.add(v.L[0] == 0)
+            return (s, v)
+
+        def thresh_cons(c: ModelConfig, v, thresh: float):
+            return v.S[-1] - v.S[0] < thresh * c.C * (c.T - 1)
+
+        def model_cons(c: ModelConfig, thresh: float):
+            s, v = base_cons(c)
+            s.add(thresh_cons(c, v, thresh))
+            return (s, v)
+
+        bound = find_bound(model_cons, c, BinarySearch(0, 1, 0.1), 60)
+
+        # Remember the solver, to check that push/pop leaves it unchanged
+        solvers = []
+
+        def base_cons_saved(c: ModelConfig):
+            s, v = base_cons(c)
+            solvers.append((s, [str(x) for x in s.s.assertions()]))
+            return (s, v)
+
+        self.assertEqual(
+            find_bound_incremental(base_cons_saved, thresh_cons, c,
+                                   BinarySearch(0, 1, 0.1), 60),
+            bound)
+        self.assertEqual(len(solvers), 1)
+        s, before = solvers[0]
+        self.assertEqual([str(x) for x in s.s.assertions()], before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from config import ModelConfig
+from model import make_solver
+from warm_start import hint_from_simulation, hint_literals, perturb, \
+    run_query_warm
+
+
+class TestWarmStart(unittest.TestCase):
+    def query(self, c: ModelConfig):
+        s, v, _ = make_solver(c)
+        s.add(v.S[-1] - v.S[0] < 0.7 * c.C * (c.T - 1))
+        return (s, v)
+
+    def test_run_query_warm(self):
+        c = ModelConfig.default()
+        c.cca = "aimd"
+        c.buf_min = 1
+        c.buf_max = 1
+        c.T = 6
+
+        hint = hint_from_simulation(
+            c, lambda S, A: S[:, -1] - S[:, 0], samples=1000)
+        self.assertIsNotNone(hint)
+        s, v = self.query(c)
+        self.assertEqual(str(s.s.check(*hint_literals(hint))), "sat")
+        s, v = self.query(c)
+        qres, warm = run_query_warm(c, s, v, hint, timeout=60)
+        self.assertEqual(str(qres.satisfiable), "sat")
+        self.assertTrue(warm)
+
+        # A hint whose discrete choices are impossible falls back to a plain
+        # solve
+        bad = perturb(qres.model)
+        for t in range(c.T):
+            bad[f"timeout_0,{t}"] = True
+        s, v = self.query(c)
+        self.assertEqual(str(s.s.check(*hint_literals(bad))), "unsat")
+        s, v = self.query(c)
+        qres, warm = run_query_warm(c, s, v, bad, timeout=60)
+        self.assertEqual(str(qres.satisfiable), "sat")
+        self.assertFalse(warm)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,27 +1,49 @@
 from fractions import Fraction
-from typing import Callable, Dict, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import z3
 
 from config import ModelConfig
-from pyz3_utils import BinarySearch, MySolver
-
-ModelDict = Dict[str, Union[Fraction, bool]]
-
-
-def model_to_dict(model: z3.ModelRef) -> ModelDict:
-    ''' Utility function that takes a z3 model and extracts its variables to a
-    dict'''
-    decls = model.decls()
-    res: Dict[str, Union[float, bool]] = {}
-    for d in decls:
-        val = model[d]
-        if type(val) == z3.BoolRef:
-            res[d.name()] = bool(val)
-        elif type(val) == z3.IntNumRef:
-            res[d.name()] = Fraction(val.as_long())
+from pyz3_utils import BinarySearch, MySolver, run_query, sat_to_val
+from variables import Variables
+
+ModelDict = Dict[str, Union[Fraction, float, bool]]
+
+
+def model_to_dict(model: z3.ModelRef,
+                  prefixes: Optional[List[str]] = None,
+                  exact: bool = True) -> ModelDict:
+    '''Utility function that takes a z3 model and extracts its variables to a
+    dict. If `prefixes` is given, only variables whose names start with one
+    of them are extracted. If `exact` is false, numbers are returned as
+    floats rather than Fractions, which is faster (e.g. for plotting; see
+    `model_trace.Trace`).
+
+    This uses Z3's C API directly, since going through the Python wrappers
+    (`model[d].as_fraction()`) dominates extraction time for large models.
+    Uninterpreted functions (e.g. from loss_detected_frontier) are auxiliary
+    and have no single value, so they are skipped
+
+    '''
+    ctx = model.ctx.ref()
+    m = model.model
+    prefix_tuple = None if prefixes is None else tuple(prefixes)
+    res: ModelDict = {}
+    for i in range(z3.Z3_model_get_num_consts(ctx, m)):
+        d = z3.Z3_model_get_const_decl(ctx, m, i)
+        name = z3.Z3_get_symbol_string(ctx, z3.Z3_get_decl_name(ctx, d))
+        if prefix_tuple is not None and not name.startswith(prefix_tuple):
+            continue
+        val = z3.Z3_model_get_const_interp(ctx, m, d)
+        kind = z3.Z3_get_ast_kind(ctx, val)
+        if kind != z3.Z3_NUMERAL_AST:
+            # Booleans are applications of true/false
+            bval = z3.Z3_get_bool_value(ctx, val)
+            assert bval != z3.Z3_L_UNDEF, f"Unrecognized value for {name}"
+            res[name] = bval == z3.Z3_L_TRUE
+        elif exact:
+            res[name] = Fraction(z3.Z3_get_numeral_string(ctx, val))
         else:
-            # Assume it is numeric
-            res[d.name()] = val.as_fraction()
+            res[name] = z3.Z3_get_numeral_double(ctx, val)
     return res
 
 
@@ -49,17 +71,52 @@ def make_periodic(c, s, v, dur: int):
             s.add(v.r_f[n][c.T - 1 - dt] == v.r_f[n][dur - 1 - dt])
 
 
-def find_bound(model_cons: Callable[[ModelConfig, float], MySolver],
+def find_bound(model_cons: Callable[[ModelConfig, float],
+                                     Tuple[MySolver, Variables]],
                cfg: ModelConfig, search: BinarySearch, timeout: float):
     while True:
         thresh = search.next_pt()
         if thresh is None:
             break
-        s = model_cons(cfg, thresh)
+        s, v = model_cons(cfg, thresh)
 
         print(f"Testing threshold = {thresh}")
-        qres = cache.run_query(s, cfg, timeout=timeout)
+        qres = run_query(cfg, s, v, timeout=timeout)
 
         print(qres.satisfiable)
         search.register_pt(thresh, sat_to_val(qres.satisfiable))
     return search.get_bounds()
+
+
+def find_bound_incremental(
+        base_cons: Callable[[ModelConfig], Tuple[MySolver, Variables]],
+        thresh_cons: Callable[[ModelConfig, Variables, float], z3.BoolRef],
+        cfg: ModelConfig, search: BinarySearch, timeout: float):
+    '''Like `find_bound`, but the model is encoded only once. `base_cons`
+    builds the solver without the threshold (typically by calling
+    `make_solver` and adding the assumptions) and `thresh_cons` returns the
+    constraint for a given threshold. Each threshold is checked inside a
+    push/pop scope on the same solver, so Z3 keeps what it learnt about the
+    base model between probes.
+
+    Results are not cached, since the solver is never rebuilt from scratch.
+    Use `find_bound` if that matters.
+
+    '''
+    s, v = base_cons(cfg)
+    s.set(timeout=int(timeout * 1000))
+    while True:
+        thresh = search.next_pt()
+        if thresh is None:
+            break
+
+        print(f"Testing threshold = {thresh}")
+        # MySolver doesn't wrap push/pop, so scope the wrapped z3 solver
+        s.s.push()
+        s.add(thresh_cons(cfg, v, thresh))
+        satisfiable = str(s.check())
+        s.s.pop()
+
+        print(satisfiable)
+        search.register_pt(thresh, sat_to_val(satisfiable))
+    return search.get_bounds()
@@ -1,7 +1,8 @@
 from typing import Any, List, Optional, Tuple
+from z3 import BoolRef, BoolVal
 
 from config import ModelConfig
-from pyz3_utils import MySolver
+from pyz3_utils import ModelDict, MySolver
 import pyz3_utils
 
 
@@ -10,8 +11,6 @@ class Variables(pyz3_utils.Variables):
 
     def __init__(self, c: ModelConfig, s: MySolver,
                  name: Optional[str] = None):
-        T = c.T
-
         # Add a prefix to all names so we can have multiple Variables instances
         # in one solver
         if name is None:
@@ -20,6 +19,42 @@ class Variables(pyz3_utils.Variables):
             pre = name + "__"
         self.pre = pre
 
+        self.alloc_timesteps(c, s)
+
+        # This is for the non-composing model where waste is allowed only when
+        # A - L and S come within epsilon of each other. See in 'config' for
+        # how epsilon can be configured
+        if not c.compose:
+            self.epsilon = s.Real(f"{pre}epsilon")
+
+        # The number of dupacks that need to arrive before we declare that a
+        # loss has occured by dupacks. Z3 can usually pick any amount. You can
+        # also set dupacks = 3 * alpha to emulate the usual behavior
+        if c.dupacks is None:
+            self.dupacks = s.Real(f"{pre}dupacks")
+            s.add(self.dupacks >= 0)
+        else:
+            self.dupacks = c.dupacks
+
+        # The MSS. Since C=1 (arbitrary units), C / alpha sets the link rate in
+        # MSS/timestep. Typically we allow Z3 to pick any value it wants to
+        # search through the set of all possible link rates
+        if c.alpha is None:
+            self.alpha = s.Real(f"{pre}alpha")
+            s.add(self.alpha > 0)
+        else:
+            self.alpha = c.alpha
+
+    def alloc_timesteps(self, c: ModelConfig, s: MySolver):
+        '''Allocate the time-indexed variables for timesteps 0..c.T-1. Z3
+        identifies variables by name, so calling this again with a larger
+        c.T extends the lists while keeping the existing variables (see
+        `bmc.py`)
+
+        '''
+        T = c.T
+        pre = self.pre
+
         # Naming convention: X_f denotes per-flow values (note, we only study
         # the single-flow case in the paper)
 
@@ -65,33 +100,27 @@ class Variables(pyz3_utils.Variables):
 
         # This is only computed when calculate_qdel=True since not all CCAs
         # require it. Of the CCAs implemented so far, only Copa requires it
-        if c.calculate_qdel:
+        if c.calculate_qdel and c.qdel_encoding == "matrix":
             self.qdel = [[s.Bool(f"{pre}qdel_{t},{dt}") for dt in range(T)]
                          for t in range(T)]
 
-        # This is for the non-composing model where waste is allowed only when
-        # A - L and S come within epsilon of each other. See in 'config' for
-        # how epsilon can be configured
-        if not c.compose:
-            self.epsilon = s.Real(f"{pre}epsilon")
-
-        # The number of dupacks that need to arrive before we declare that a
-        # loss has occured by dupacks. Z3 can usually pick any amount. You can
-        # also set dupacks = 3 * alpha to emulate the usual behavior
-        if c.dupacks is None:
-            self.dupacks = s.Real(f"{pre}dupacks")
-            s.add(self.dupacks >= 0)
-        else:
-            self.dupacks = c.dupacks
+        # The compact alternative: the queueing delay is t - qdel_index[t].
+        # If S moved at t, qdel_index[t] is the time at which the bytes
+        # exiting at t were input. Otherwise the last delay carries forward,
+        # as above. If it is 0, the bytes may have been input before t=0, so
+        # the delay is unknown (all of qdel[t] are false)
+        if c.calculate_qdel and c.qdel_encoding == "index":
+            self.qdel_index = [s.Int(f"{pre}qdel_index_{t}") for t in range(T)]
 
-        # The MSS. Since C=1 (arbitrary units), C / alpha sets the link rate in
-        # MSS/timestep. Typically we allow Z3 to pick any value it wants to
-        # search through the set of all possible link rates
-        if c.alpha is None:
-            self.alpha = s.Real(f"{pre}alpha")
-            s.add(self.alpha > 0)
-        else:
-            self.alpha = c.alpha
+    def qdel_is(self, t: int, dt: int) -> BoolRef:
+        ''' Whether the bytes exiting at t were input at t - dt, in whichever
+        queueing delay encoding is in use '''
+        if hasattr(self, "qdel"):
+            return self.qdel[t][dt]
+        if t - dt < 1:
+            # Index 0 means the delay is unknown
+            return BoolVal(False)
+        return self.qdel_index[t] == t - dt
 
 
 class VariableNames:
@@ -115,3 +144,21 @@ class VariableNames:
                 else:
                     res.append(str(y))
         return res
+
+
+class VariableValues:
+    ''' Class with the same structure as Variables, but with the values the
+    solver picked. Names missing from the model (e.g. constants like a fixed
+    alpha) are left as they are '''
+    def __init__(self, v: Variables, m: ModelDict):
+        names = VariableNames(v)
+        for x in names.__dict__:
+            self.__dict__[x] = self.to_values(names.__dict__[x], m)
+
+    @classmethod
+    def to_values(cls, x: Any, m: ModelDict):
+        if type(x) == list:
+            return [cls.to_values(y, m) for y in x]
+        if type(x) == str and x in m:
+            return m[x]
+        return x
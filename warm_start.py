@@ -0,0 +1,165 @@
+''' Warm starting a query from a concrete trace that nearly satisfies it: one
+found by the simulator, a model cached for the same config, or an earlier
+result (possibly perturbed). The trace's booleans are given to Z3 as initial
+value hints, and we first look for a solution that makes the same discrete
+choices as the trace (which timesteps time out, when AIMD may increase, ...)
+by assuming its booleans. If there is none within a budget, we fall back to
+a plain solve on the same solver, so Z3 keeps what it learned. This helps
+most when re-running a query with a slightly different threshold.
+
+Initial values for the real variables are optional. On the AIMD queries in
+`__main__` they made some solves several times slower, since they steer the
+arithmetic solver towards the old trace even where it no longer fits '''
+
+import time
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+import z3
+
+from config import ModelConfig
+from pyz3_utils import ModelDict, MySolver, QueryResult, run_query
+from query_cache import QueryCache
+from simulator import simulate
+from variables import Variables
+
+
+def hint_from_simulation(c: ModelConfig,
+                         score: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                         samples: int = 100000, seed: int = 0,
+                         alpha: float = 0.1) -> Optional[ModelDict]:
+    '''Simulate `samples` random schedules and return the feasible trace with
+    the lowest `score`, which takes the total service and arrival arrays
+    (S, A), each of shape (samples, T), and returns one score per sample.
+    None if no schedule gave a feasible trace'''
+    rng = np.random.default_rng(seed)
+    res = simulate(c, rng.random((samples, c.T)), alpha=alpha)
+    scores = np.where(res.feasible, score(res.S, res.A), np.inf)
+    b = int(np.argmin(scores))
+    if not res.feasible[b]:
+        return None
+    return res.model(b)
+
+
+def hint_from_cache(cache: QueryCache, c: ModelConfig) -> Optional[ModelDict]:
+    ''' The most recent satisfying model stored for this config, by any query
+    '''
+    for row in reversed(cache.results_for(c)):
+        if row["satisfiable"] == "sat" and row["model"] is not None:
+            return row["model"]
+    return None
+
+
+def perturb(m: ModelDict, scale: float = 0.05, seed: int = 0) -> ModelDict:
+    ''' A copy of `m` with every number scaled by a random factor around 1.
+    Booleans are kept '''
+    rng = np.random.default_rng(seed)
+    return {k: (x if type(x) is bool
+                else float(x) * (1 + scale * rng.standard_normal()))
+            for (k, x) in m.items()}
+
+
+def hint_literals(m: ModelDict) -> List[z3.BoolRef]:
+    ''' The trace's discrete choices, as literals to assume '''
+    return [z3.Bool(k) if x else z3.Not(z3.Bool(k))
+            for (k, x) in m.items() if type(x) is bool]
+
+
+def set_hints(s: MySolver, c: ModelConfig, v: Variables, m: ModelDict,
+              values: bool = False):
+    '''Give Z3 the trace's booleans as initial values, and if `values`, also
+    its values for the real-valued `Variables` arrays. Does nothing if this
+    version of Z3 doesn't support it'''
+    # The z3 solver MySolver wraps
+    solver = s.s
+    if not hasattr(solver, "set_initial_value"):
+        return
+    for (k, x) in m.items():
+        if type(x) is bool:
+            solver.set_initial_value(z3.Bool(k), z3.BoolVal(x))
+    if not values:
+        return
+    xs = [v.alpha, v.dupacks] + ([v.epsilon] if not c.compose else [])
+    for ys in v.A_f + v.S_f + v.L_f + v.Ld_f + v.c_f + v.r_f \
+            + [v.A, v.S, v.L, v.W]:
+        xs.extend(ys)
+    for x in xs:
+        if not z3.is_expr(x) or str(x) not in m:
+            # A constant set in the config
+            continue
+        solver.set_initial_value(x, m[str(x)])
+
+
+def run_query_warm(c: ModelConfig, s: MySolver, v: Variables,
+                   hint: Optional[ModelDict], timeout: float = 10,
+                   budget: float = 0.5, values: bool = False,
+                   verbose: bool = False) -> Tuple[QueryResult, bool]:
+    '''Like `run_query`, but warm started from `hint` (a plain solve if it
+    is None). Up to a `budget` fraction of the timeout is spent looking for a
+    solution with the same discrete choices as the hint. `values` is passed
+    to `set_hints`. Also returns whether that warm search found the result'''
+    if hint is None:
+        return (run_query(c, s, v, timeout), False)
+    set_hints(s, c, v, hint, values)
+
+    start = time.time()
+    s.set(timeout=int(budget * timeout * 1000))
+    lits = hint_literals(hint)
+    # MySolver's check takes no assumptions, so use the z3 solver it wraps
+    warm = str(s.s.check(*lits)) == "sat"
+    elapsed = time.time() - start
+    if verbose:
+        print(f"Warm start {'succeeded' if warm else 'failed'} in "
+              f"{elapsed:.2f}s")
+    # Don't leave the budget as the solver's timeout
+    remaining = max(timeout - elapsed, 1)
+    s.set(timeout=int(remaining * 1000))
+    if not warm:
+        return (run_query(c, s, v, remaining), False)
+
+    # Get the result in the usual form. This is immediate, since the solver
+    # just found it
+    s.s.push()
+    s.add(z3.And(lits))
+    qres = run_query(c, s, v, remaining)
+    s.s.pop()
+    return (qres, True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Find AIMD traces with lower and lower utilization, warm "
+        "starting each query from the last one's result")
+    parser.add_argument("--cold", action="store_true",
+                        help="Solve every query from scratch, to compare")
+    parser.add_argument("--values", action="store_true",
+                        help="Also hint the values of real variables")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    from model import make_solver
+
+    c = ModelConfig.default()
+    c.cca = "aimd"
+    c.buf_min = 1
+    c.buf_max = 1
+    c.T = 15
+
+    def utilization(S: np.ndarray, A: np.ndarray) -> np.ndarray:
+        return (S[:, -1] - S[:, 0]) / (c.C * (c.T - 1))
+
+    hint = None if args.cold else hint_from_simulation(c, utilization)
+    for thresh in [0.6, 0.55, 0.5, 0.45]:
+        s, v, _ = make_solver(c)
+        s.add(v.L[0] == 0)
+        s.add(v.S[-1] - v.S[0] < thresh * c.C * (c.T - 1))
+        start = time.time()
+        qres, _ = run_query_warm(c, s, v, hint, args.timeout,
+                                 values=args.values, verbose=True)
+        print(f"utilization < {thresh}: {qres.satisfiable} in "
+              f"{time.time() - start:.2f}s")
+        if str(qres.satisfiable) != "sat":
+            break
+        if not args.cold:
+            hint = qres.model